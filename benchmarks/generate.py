@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# Generates synthetic OWL/XML ontologies for the benchmarks. Labels and
+# comments are drawn from the vocabulary of a seed ontology (by default the
+# bundled dumontiertime.xml), so WordNet hit rates and domain matches stay
+# close to those of a real ontology.
+import argparse
+import os
+import random
+import re
+import sys
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from ontparser.owlparser import Owl  # noqa: E402
+
+SEED = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                    '..', 'ontparser', 'static', 'dumontiertime.xml')
+BASE = 'http://example.org/benchmark'
+WORD = re.compile(r"[A-Za-z][a-z]+")
+
+DEFAULTS = {
+    'classes': 1000,
+    'fan_out': 4,
+    'fan_in': 1.2,
+    'depth': 8,
+    'label_density': 0.9,
+    'comment_density': 0.3,
+    'comment_words': 12,
+    'object_properties': 20,
+    'data_properties': 10,
+    'seed': 0,
+}
+
+
+def vocabulary(seed_path=SEED):
+    # (label words, comment words) of the seed ontology
+    stdout = sys.stdout
+    sys.stdout = sys.stderr  # keep the parser's messages out of generated output
+    try:
+        owl = Owl(seed_path, True)
+    finally:
+        sys.stdout = stdout
+    label_words = set()
+    for label in owl.graph.labels:
+        label_words.update(word.lower() for word in WORD.findall(label or ''))
+    comment_words = set(label_words)
+    for event, literal in etree.iterparse(seed_path, tag='{http://www.w3.org/2002/07/owl#}Literal'):
+        comment_words.update(word.lower() for word in WORD.findall(literal.text or ''))
+    return sorted(label_words), sorted(comment_words)
+
+
+def hierarchy(classes, fan_out, fan_in, depth, rng):
+    # Returns a list of parent lists, one per class. Classes are numbered in
+    # breadth-first order; each class below the roots gets a primary parent
+    # giving about fan_out children per class and at most depth levels, and
+    # on average fan_in parents in total. Parents always precede their
+    # children, so the hierarchy is acyclic.
+    parents = [[]]
+    level = [0]
+    shallow = [0]  # classes that may still receive children
+    for node in xrange(1, classes):
+        primary = (node - 1) // max(fan_out, 1)
+        if level[primary] >= depth - 1:
+            primary = rng.choice(shallow)
+        node_parents = [primary]
+        extra = fan_in - 1
+        while extra > 0 and rng.random() < extra:
+            candidate = rng.randrange(node)
+            if candidate not in node_parents:
+                node_parents.append(candidate)
+            extra -= 1
+        parents.append(node_parents)
+        level.append(level[primary] + 1)
+        if level[node] < depth - 1:
+            shallow.append(node)
+    return parents
+
+
+def generate(out, classes=1000, fan_out=4, fan_in=1.2, depth=8, label_density=0.9,
+             comment_density=0.3, comment_words=12, object_properties=20, data_properties=10,
+             seed=0, seed_path=SEED):
+    rng = random.Random(seed)
+    label_vocabulary, comment_vocabulary = vocabulary(seed_path)
+    write = out.write
+    write('<?xml version="1.0"?>\n')
+    write('<Ontology xmlns="http://www.w3.org/2002/07/owl#" xml:base="%s"\n' % BASE)
+    write('     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"\n')
+    write('     ontologyIRI="%s">\n' % BASE)
+    write('    <Prefix name="rdfs" IRI="http://www.w3.org/2000/01/rdf-schema#"/>\n')
+    for node in xrange(classes):
+        write('    <Declaration>\n        <Class IRI="#C%d"/>\n    </Declaration>\n' % node)
+    for prop in xrange(object_properties):
+        write('    <Declaration>\n        <ObjectProperty IRI="#op%d"/>\n    </Declaration>\n' % prop)
+    for prop in xrange(data_properties):
+        write('    <Declaration>\n        <DataProperty IRI="#dp%d"/>\n    </Declaration>\n' % prop)
+    for node, node_parents in enumerate(hierarchy(classes, fan_out, fan_in, depth, rng)):
+        for parent in node_parents:
+            write('    <SubClassOf>\n        <Class IRI="#C%d"/>\n        <Class IRI="#C%d"/>\n'
+                  '    </SubClassOf>\n' % (node, parent))
+    for node in xrange(classes):
+        if rng.random() < label_density:
+            label = ' '.join(rng.choice(label_vocabulary) for _ in xrange(rng.randint(1, 2)))
+            write('    <AnnotationAssertion>\n        <AnnotationProperty abbreviatedIRI="rdfs:label"/>\n'
+                  '        <IRI>#C%d</IRI>\n        <Literal>%s</Literal>\n'
+                  '    </AnnotationAssertion>\n' % (node, escape(label)))
+        if rng.random() < comment_density:
+            comment = ' '.join(rng.choice(comment_vocabulary) for _ in xrange(comment_words))
+            write('    <AnnotationAssertion>\n        <AnnotationProperty abbreviatedIRI="rdfs:comment"/>\n'
+                  '        <IRI>#C%d</IRI>\n        <Literal>%s</Literal>\n'
+                  '    </AnnotationAssertion>\n' % (node, escape(comment)))
+    write('</Ontology>\n')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Generate a synthetic OWL/XML ontology')
+    arg_parser.add_argument('output', help='file to write, - for stdout')
+    arg_parser.add_argument('--classes', type=int, default=DEFAULTS['classes'])
+    arg_parser.add_argument('--fan-out', type=int, default=DEFAULTS['fan_out'],
+                            help='children per class')
+    arg_parser.add_argument('--fan-in', type=float, default=DEFAULTS['fan_in'],
+                            help='average parents per non-root class')
+    arg_parser.add_argument('--depth', type=int, default=DEFAULTS['depth'],
+                            help='maximum number of levels')
+    arg_parser.add_argument('--label-density', type=float, default=DEFAULTS['label_density'],
+                            help='fraction of classes with a label')
+    arg_parser.add_argument('--comment-density', type=float, default=DEFAULTS['comment_density'],
+                            help='fraction of classes with a comment')
+    arg_parser.add_argument('--comment-words', type=int, default=DEFAULTS['comment_words'])
+    arg_parser.add_argument('--object-properties', type=int, default=DEFAULTS['object_properties'])
+    arg_parser.add_argument('--data-properties', type=int, default=DEFAULTS['data_properties'])
+    arg_parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    arg_parser.add_argument('--seed-ontology', default=SEED,
+                            help='OWL/XML ontology whose labels and comments supply the words')
+    args = vars(arg_parser.parse_args())
+    output = args.pop('output')
+    args['seed_path'] = args.pop('seed_ontology')
+    out = sys.stdout if output == '-' else open(output, 'w')
+    with out:
+        generate(out, **args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# Offline benchmarks for the parse and scoring hot paths. Each scenario
+# runs in a fresh process against a local (bundled or generated) ontology
+# and times every phase separately; results can be saved as a JSON baseline
+# and later runs compared against it.
+import argparse
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))
+
+from generate import DEFAULTS, SEED, generate  # noqa: E402
+
+from ontparser import lexicon  # noqa: E402
+from ontparser.hierarchy import compute_depths  # noqa: E402
+from ontparser.owlparser import Owl  # noqa: E402
+from ontparser.quality import OwlQuality, set_domain_synset_list  # noqa: E402
+
+BASELINE_DIR = os.path.join(BENCHMARK_DIR, 'baselines')
+PHASES = ('parse', 'depth', 'wordnet', 'domain', 'metrics', 'quality')
+
+# name -> generator parameters (None: the seed ontology itself)
+SCENARIOS = OrderedDict([
+    ('seed', None),
+    ('small', {'classes': 2000}),
+    ('medium', {'classes': 20000}),
+    ('wide', {'classes': 20000, 'fan_out': 50, 'depth': 3}),
+    ('deep', {'classes': 20000, 'fan_out': 2, 'fan_in': 1.5, 'depth': 40}),
+    ('large', {'classes': 200000}),
+])
+DEFAULT_SCENARIOS = ('seed', 'small', 'medium', 'wide', 'deep')
+
+
+def ontology_path(name, workdir):
+    # generated files are reused as long as their parameters are unchanged
+    params = SCENARIOS[name]
+    if params is None:
+        return SEED
+    params = dict(DEFAULTS, **params)
+    digest = hashlib.md5(json.dumps(params, sort_keys=True)).hexdigest()[:12]
+    path = os.path.join(workdir, '%s-%s.owx' % (name, digest))
+    if not os.path.exists(path):
+        if not os.path.isdir(workdir):
+            os.makedirs(workdir)
+        partial = path + '.partial'
+        with open(partial, 'w') as out:
+            generate(out, **params)
+        os.rename(partial, path)
+    return path
+
+
+def measure(path, domain, repeat):
+    # runs in a pool process, so peak RSS covers this scenario only
+    seconds = OrderedDict()
+
+    def timed(phase, function):
+        best = None
+        for _ in xrange(repeat):
+            start = time.time()
+            value = function()
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        seconds[phase] = round(best, 6)
+        return value
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')  # the parser prints progress messages
+    try:
+        lexicon.wordnet.preload()  # corpus loading is not what is measured
+
+        def parse():
+            # class labels are looked up in WordNet as they are parsed
+            lexicon.wordnet.cache.clear()
+            return Owl(path, True, domain_terms=set_domain_synset_list(domain))
+        owl = timed('parse', parse)
+        graph = owl.graph
+        timed('depth', lambda: compute_depths(graph))
+
+        def wordnet():
+            lexicon.wordnet.cache.clear()
+            return lexicon.wordnet.lookup_many(graph.labels)
+        timed('wordnet', wordnet)
+
+        def quality():
+            lexicon.wordnet.cache.clear()
+            graph.depths = None
+            return OwlQuality(owl, {'syntactic', 'semantic', 'pragmatic', 'social'}, domain)
+        owl_quality = timed('quality', quality)
+        timed('domain', lambda: owl_quality.text_index().count_all(set_domain_synset_list(domain)))
+        timed('metrics', owl_quality.semiotic_metric_value_computation)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    classes = len(graph)
+    megabytes = os.path.getsize(path) / 1048576.0
+    return OrderedDict([
+        ('classes', classes),
+        ('edges', len(graph.parent_ids)),
+        ('megabytes', round(megabytes, 3)),
+        ('seconds', OrderedDict((phase, seconds[phase]) for phase in PHASES)),
+        ('classes_per_second', OrderedDict(
+            (phase, int(round(classes / seconds[phase]))) if seconds[phase] else (phase, None)
+            for phase in PHASES)),
+        ('parse_megabytes_per_second', round(megabytes / seconds['parse'], 3)),
+        # ru_maxrss is in kilobytes on Linux
+        ('peak_rss_megabytes', round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)),
+    ])
+
+
+def run(names, workdir, domain, repeat):
+    results = OrderedDict()
+    for name in names:
+        path = ontology_path(name, workdir)
+        pool = multiprocessing.Pool(1)
+        try:
+            results[name] = pool.apply(measure, (path, domain, repeat))
+        finally:
+            pool.terminate()
+            pool.join()
+        report(name, results[name])
+    return results
+
+
+def report(name, result):
+    print '%-8s %7d classes %8.2f MB  peak RSS %7.1f MB  parse %.2f MB/s' % (
+        name, result['classes'], result['megabytes'], result['peak_rss_megabytes'],
+        result['parse_megabytes_per_second'])
+    for phase in PHASES:
+        print '    %-8s %9.4f s %12s classes/s' % (
+            phase, result['seconds'][phase], result['classes_per_second'][phase])
+
+
+def baseline_path(name):
+    if os.sep in name or name.endswith('.json'):
+        return name
+    return os.path.join(BASELINE_DIR, name + '.json')
+
+
+def compare(results, baseline, tolerance, floor):
+    # Returns a list of regressions: phases (or peak RSS) more than
+    # tolerance slower (larger) than the baseline. Times under floor seconds
+    # are too noisy to compare.
+    regressions = []
+    for name, result in results.iteritems():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        for phase in PHASES:
+            before = old['seconds'].get(phase)
+            after = result['seconds'][phase]
+            if before and max(before, after) >= floor and after > before * (1 + tolerance):
+                regressions.append('%s %s: %.4f s -> %.4f s' % (name, phase, before, after))
+        before = old['peak_rss_megabytes']
+        after = result['peak_rss_megabytes']
+        if after > before * (1 + tolerance):
+            regressions.append('%s peak RSS: %.1f MB -> %.1f MB' % (name, before, after))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark parsing and scoring')
+    arg_parser.add_argument('scenarios', nargs='*',
+                            help='scenarios to run, from %s (default: %s)' % (
+                                ', '.join(SCENARIOS), ', '.join(DEFAULT_SCENARIOS)))
+    arg_parser.add_argument('--domain', default='time,interval')
+    arg_parser.add_argument('--repeat', type=int, default=3,
+                            help='runs per phase; the fastest is reported')
+    arg_parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'owlparser-benchmarks'),
+                            help='where generated ontologies are kept')
+    arg_parser.add_argument('--save', metavar='BASELINE',
+                            help='save the results as benchmarks/baselines/BASELINE.json (or a path)')
+    arg_parser.add_argument('--compare', metavar='BASELINE',
+                            help='compare against a saved baseline; exits with 1 on regressions')
+    arg_parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='allowed slowdown before a phase counts as a regression')
+    arg_parser.add_argument('--floor', type=float, default=0.01,
+                            help='ignore phases faster than this many seconds')
+    args = arg_parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        arg_parser.error('unknown scenarios: %s' % ', '.join(sorted(unknown)))
+
+    results = run(args.scenarios or DEFAULT_SCENARIOS, args.workdir, args.domain, args.repeat)
+
+    if args.save:
+        document = OrderedDict([
+            ('created', datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')),
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('cpus', multiprocessing.cpu_count()),
+            ('domain', args.domain),
+            ('repeat', args.repeat),
+            ('results', results),
+        ])
+        with open(baseline_path(args.save), 'w') as out:
+            json.dump(document, out, indent=2, separators=(',', ': '))
+            out.write('\n')
+    if args.compare:
+        with open(baseline_path(args.compare)) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.tolerance, args.floor)
+        for regression in regressions:
+            print 'REGRESSION ' + regression
+        if regressions:
+            sys.exit(1)
+        print 'No regressions against %s' % args.compare
+
+
+if __name__ == '__main__':
+    main()
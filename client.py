@@ -7,7 +7,14 @@ import requests
 def main():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('ontology_url',
+                            nargs='?',
                             help='url for the OWL/XML file')
+    arg_parser.add_argument('--batch',
+                            metavar='FILE',
+                            help='score every ontology listed in FILE, one url or JSON object per line')
+    arg_parser.add_argument('--timeout',
+                            type=int,
+                            help='per-ontology timeout in seconds (with --batch)')
     arg_parser.add_argument('--localhost',
                             action='store_true',
                             help='use localhost rather than owlparser.herokuapp.com')
@@ -20,21 +27,48 @@ def main():
     arg_parser.add_argument('--already_converted',
                             action='store_true',
                             help='already converted')
-    arg_parser.add_argument('--debug',
+    arg_parser.add_argument('--profile',
                             action='store_true',
-                            help='print more info on server')
+                            help='include phase timings, counters and memory use in the response')
+    arg_parser.add_argument('--trace',
+                            action='store_true',
+                            help='have the server write a cProfile trace (needs OWLPARSER_TRACE_DIR there)')
+    arg_parser.add_argument('--diff',
+                            action='store_true',
+                            help='report changes and metric deltas against the release scored last')
+    arg_parser.add_argument('--previous',
+                            metavar='URL',
+                            help='report changes and metric deltas against the release at URL')
+    arg_parser.add_argument('--imports',
+                            action='store_true',
+                            help='score the ontology together with the ontologies it imports')
+    arg_parser.add_argument('--preview',
+                            action='store_true',
+                            help='estimate the WordNet and domain metrics from samples')
     args = arg_parser.parse_args()
+    if bool(args.ontology_url) == bool(args.batch):
+        arg_parser.error('give either an ontology_url or --batch FILE')
     if args.localhost:
         owlparser_url = 'http://localhost:5000/rest/execute'
     else:
         owlparser_url = 'https://owlparser.herokuapp.com/rest/execute'
+    if args.batch:
+        batch(args, owlparser_url.replace('/rest/execute', '/rest/batch'))
+        return
     params = {'url': args.ontology_url}
     if args.domain:
         params['domain'] = args.domain
     if args.exclude_semiotic_layer:
         params['exclude_semiotic_layer'] = args.exclude_semiotic_layer
     params['already_converted'] = args.already_converted
-    params['debug'] = args.debug
+    params['profile'] = args.profile
+    params['trace'] = args.trace
+    params['diff'] = args.diff
+    params['imports'] = args.imports
+    if args.preview:
+        params['mode'] = 'preview'
+    if args.previous:
+        params['previous'] = args.previous
     r = requests.get(owlparser_url, params=params)
 
     print('\nRequest:\n\n%s' % r.url)
@@ -42,5 +76,34 @@ def main():
     print json.dumps(r.json(), sort_keys=True, separators=(',', ': '), indent=4)
 
 
+def batch(args, batch_url):
+    # Lines holding a JSON object may set url, domain, exclude_semiotic_layer,
+    # already_converted and timeout; the command line options are the
+    # defaults for every item.
+    items = []
+    with open(args.batch) as batch_file:
+        for line in batch_file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            item = json.loads(line) if line.startswith('{') else {'url': line}
+            if args.domain:
+                item.setdefault('domain', args.domain)
+            if args.exclude_semiotic_layer:
+                item.setdefault('exclude_semiotic_layer', args.exclude_semiotic_layer)
+            if args.already_converted:
+                item.setdefault('already_converted', True)
+            items.append(item)
+    body = {'items': items}
+    if args.timeout:
+        body['timeout'] = args.timeout
+    r = requests.post(batch_url, json=body, stream=True)
+    r.raise_for_status()
+    # print each outcome as the server finishes it
+    for line in r.iter_lines():
+        if line:
+            print line
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,12 @@
+# gunicorn -c gunicorn.conf.py ontparser:app
+#
+# Load the application, and WordNet with it, once in the master process;
+# the workers it forks start warm instead of loading WordNet during their
+# first request. The workers also share the job store file the master
+# names (see jobs.store_path).
+preload_app = True
+
+
+def on_starting(server):
+    from ontparser import warm_up
+    warm_up()
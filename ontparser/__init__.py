@@ -1,5 +1,24 @@
+import os
+
 from flask import Flask, current_app
 app = Flask(__name__)
 
 import ontparser.restapi
 import ontparser.views
+
+
+def warm_up():
+    # Load the WordNet index (and with it nltk) now rather than in the
+    # first request. Called in the gunicorn master before it forks (see
+    # gunicorn.conf.py), the workers start with it loaded and share its
+    # pages until they write to them.
+    ontparser.lexicon.wordnet.preload(WARM_UP_LABELS)
+
+
+# looked up by warm_up so the WordNet data files and morphy tables are read
+# as well as the index
+WARM_UP_LABELS = ('entity', 'time', 'cells', 'measured')
+
+if os.environ.get('OWLPARSER_WORDNET_PRELOAD'):
+    # load the WordNet index at startup rather than in the first request
+    warm_up()
@@ -0,0 +1,144 @@
+# -*- encoding: utf-8 -*-
+from itertools import izip
+
+import numpy as np
+
+# Structural analytics of a class hierarchy, computed with NumPy over the
+# Graph's CSR adjacency arrays (viewed, not copied). The hierarchy is
+# walked a level at a time: every class at one depth is handled by the
+# same few array operations, instead of a Python loop per class and edge.
+
+# A level costs some tens of microseconds however few classes it has, so a
+# hierarchy averaging fewer classes per level than this (a long chain) is
+# walked with plain loops instead.
+NARROW = 32
+
+
+def column(values, dtype=np.intc):
+    # an array('i') column of a Graph as an ndarray
+    if not len(values):
+        return np.zeros(0, dtype)
+    return np.frombuffer(values, dtype)
+
+
+def gather(offsets, adjacent, node_ids):
+    # the CSR neighbours of node_ids, concatenated, and how many each has
+    starts = offsets[node_ids]
+    counts = offsets[node_ids + 1] - starts
+    total = counts.sum()
+    if not total:
+        return np.zeros(0, adjacent.dtype), counts
+    # position of each neighbour within its node's run, plus the run start
+    runs = np.repeat(np.cumsum(counts) - counts, counts)
+    return adjacent[np.arange(total) - runs + np.repeat(starts, counts)], counts
+
+
+def levels(graph):
+    # Longest-path depth of every class, from a level-synchronous
+    # topological pass: the classes whose last superclass was at depth d
+    # are released together at depth d + 1. Returns None if subclass
+    # cycles stop the pass before every class is placed (compute_depths
+    # then breaks them one at a time), or if the hierarchy turns out to be
+    # narrow.
+    n = len(graph)
+    parent_offsets = column(graph.parent_offsets)
+    child_offsets = column(graph.child_offsets)
+    child_ids = column(graph.child_ids)
+    pending = np.diff(parent_offsets)
+    depth = np.zeros(n, np.intc)
+    frontier = np.flatnonzero(pending == 0)
+    placed = len(frontier)
+    level = 0
+    while len(frontier):
+        level += 1
+        if level > NARROW and placed < NARROW * level:
+            return None
+        children, _ = gather(child_offsets, child_ids, frontier)
+        if not len(children):
+            break
+        children, hits = np.unique(children, return_counts=True)
+        pending[children] -= hits
+        frontier = children[pending[children] == 0]
+        depth[frontier] = level
+        placed += len(frontier)
+    if placed < n:
+        return None
+    return depth
+
+
+class Structure(object):
+    # Depth, breadth, fan-out, tangledness and descendant statistics of a
+    # Graph whose depths have been computed (compute_depths).
+
+    def __init__(self, graph):
+        n = self.num_classes = len(graph)
+        depth = self.depth = column(graph.max_depth)
+        num_parents = np.diff(column(graph.parent_offsets))
+        num_children = self.num_children = np.diff(column(graph.child_offsets))
+
+        leaves = num_children == 0
+        self.num_leaves = int(leaves.sum())
+        self.deepest_leaf = int(depth[leaves].max()) if self.num_leaves else 0
+        self.leaf_depth_total = int(depth[leaves].sum(dtype=np.int64))
+        # classes per depth, and classes per number of subclasses
+        self.breadth = np.bincount(depth, minlength=1) if n else np.zeros(1, np.intp)
+        self.fan_out = np.bincount(num_children, minlength=1) if n else np.zeros(1, np.intp)
+        self.num_inner = n - self.num_leaves
+        self.num_edges = int(num_children.sum())
+        self.num_tangled = int((num_parents > 1).sum())
+        self.descendants = self.split_descendants(graph, depth, num_parents)
+
+    @staticmethod
+    def split_descendants(graph, depth, num_parents):
+        # Descendants of each class, a class with k superclasses counting
+        # 1/k below each of them (with its own descendants), so a shared
+        # subtree is not counted twice and the classes below the roots add
+        # up to the classes that are not roots. Summed a level at a time
+        # from the deepest up; an edge that does not go down a level (a
+        # broken subclass cycle) is left out.
+        n = len(depth)
+        descendants = np.zeros(n)
+        if not n:
+            return descendants
+        child = np.repeat(np.arange(n, dtype=np.intc), num_parents)
+        parent = column(graph.parent_ids)
+        down = depth[child] > depth[parent]
+        child = child[down]
+        parent = parent[down]
+        shares = np.bincount(child, minlength=n)
+        order = np.argsort(-depth[child], kind='mergesort')
+        child = child[order]
+        parent = parent[order]
+        # edges grouped by the depth of the subclass, deepest first
+        bounds = np.flatnonzero(np.diff(depth[child])) + 1
+        if len(bounds) + 1 > NARROW and len(child) < NARROW * (len(bounds) + 1):
+            descendants = descendants.tolist()
+            shares = shares.tolist()
+            for below, above in izip(child.tolist(), parent.tolist()):
+                descendants[above] += (1.0 + descendants[below]) / shares[below]
+            return np.array(descendants)
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(child)]):
+            below = child[start:stop]
+            parents, where = np.unique(parent[start:stop], return_inverse=True)
+            descendants[parents] += np.bincount(
+                where, (1.0 + descendants[below]) / shares[below])
+        return descendants
+
+    def avg_leaf_depth(self):
+        if not self.num_leaves:
+            return 0
+        return float(self.leaf_depth_total) / self.num_leaves
+
+    def metrics(self):
+        # the sub-metrics added to the owl_quality result
+        n = self.num_classes
+        return {
+            # share of classes with more than one superclass
+            'tangledness': round(float(self.num_tangled) / n, 3) if n else 0.0,
+            # mean subclasses of a class that has any
+            'fan_out': round(float(self.num_edges) / self.num_inner, 3) if self.num_inner else 0.0,
+            # deepest level, and most classes on one level
+            'depth': len(self.breadth) - 1,
+            'breadth': int(self.breadth.max()),
+            'descendants': round(float(self.descendants.mean()), 3) if n else 0.0,
+        }
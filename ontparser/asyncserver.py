@@ -0,0 +1,196 @@
+# -*- encoding: utf-8 -*-
+# Cooperative (gevent) server for /rest/execute. Downloads run in
+# greenlets, so a slow host only holds a greenlet, and parsing and scoring
+# run in a pool of worker processes (ontparser.worker), so the event loop
+# never waits on the CPU. Run it with
+#
+#   python -m ontparser.asyncserver
+#
+# or under gunicorn with gunicorn -k gevent ontparser.asyncserver:application.
+from gevent import monkey
+monkey.patch_all()
+
+import json  # noqa: E402
+import os  # noqa: E402
+import socket  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+from urlparse import urlparse  # noqa: E402
+
+import gevent  # noqa: E402
+from gevent import subprocess  # noqa: E402
+from gevent.lock import BoundedSemaphore  # noqa: E402
+from gevent.pywsgi import WSGIHandler, WSGIServer  # noqa: E402
+from gevent.queue import Queue  # noqa: E402
+from gevent.socket import wait_read  # noqa: E402
+from werkzeug.exceptions import HTTPException  # noqa: E402
+from werkzeug.wrappers import Response  # noqa: E402
+
+# downloads go to the local mirror, which the workers then read from
+if not os.environ.get('OWLPARSER_MIRROR_DIR'):
+    os.environ['OWLPARSER_MIRROR_DIR'] = tempfile.mkdtemp(prefix='owlparser-mirror-')
+
+from ontparser import app, mirror  # noqa: E402
+from ontparser.restapi import execute_arguments, execute_options  # noqa: E402
+
+# concurrent downloads from one host
+HOST_DOWNLOADS = int(os.environ.get('OWLPARSER_HOST_DOWNLOADS', 4))
+# scoring processes
+WORKERS = int(os.environ.get('OWLPARSER_ASYNC_WORKERS', 2))
+# requests that may wait for a scoring process before new ones are turned
+# away with 503
+QUEUE_SIZE = int(os.environ.get('OWLPARSER_ASYNC_QUEUE', 32))
+
+
+class Busy(Exception):
+    pass
+
+
+class HostLimits(object):
+    # one bounded semaphore per host
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._slots = {}
+
+    def slot(self, url):
+        host = urlparse(url).netloc
+        if host not in self._slots:
+            self._slots[host] = BoundedSemaphore(self.per_host)
+        return self._slots[host]
+
+
+class WorkerPool(object):
+    # Scoring processes, started when first needed. A request waits for an
+    # idle process in the idle queue; at most queue_size requests wait. A
+    # process whose request is cancelled (or that dies) is killed and
+    # replaced by a fresh one on next use.
+
+    def __init__(self, size, queue_size):
+        self.queue_size = queue_size
+        self.waiting = 0
+        self.idle = Queue()
+        for _ in xrange(size):
+            self.idle.put(None)
+        # the workers read the copies this process has just downloaded or
+        # revalidated, so they never revalidate themselves
+        self.env = dict(os.environ, OWLPARSER_MIRROR_MAX_AGE='inf')
+
+    def start(self):
+        return subprocess.Popen([sys.executable, '-m', 'ontparser.worker'], env=self.env,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def evaluate(self, request):
+        if self.waiting >= self.queue_size:
+            raise Busy()
+        self.waiting += 1
+        try:
+            process = self.idle.get()
+        finally:
+            self.waiting -= 1
+        try:
+            if process is None or process.poll() is not None:
+                process = self.start()
+            process.stdin.write(json.dumps(request) + '\n')
+            process.stdin.flush()
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError('scoring process exited with status {}'.format(process.wait()))
+            return json.loads(line)
+        except BaseException:
+            # including GreenletExit when the client hung up
+            if process is not None and process.poll() is None:
+                process.kill()
+            process = None
+            raise
+        finally:
+            self.idle.put(process)
+
+
+host_limits = HostLimits(HOST_DOWNLOADS)
+workers = WorkerPool(WORKERS, QUEUE_SIZE)
+
+
+def watch_client(client, evaluation):
+    # a GET has no body, so the connection only turns readable when the
+    # client closes it (or pipelines another request, which is left alone)
+    try:
+        wait_read(client.fileno())
+        if not client.recv(1, socket.MSG_PEEK):
+            evaluation.kill(block=False)
+    except (socket.error, IOError):
+        evaluation.kill(block=False)
+
+
+def evaluate(url, request):
+    if url.startswith('http'):
+        with host_limits.slot(url):
+            mirror.mirror.fetch(url)
+    return workers.evaluate(request)
+
+
+def json_response(state, status=200, headers=None):
+    return Response(json.dumps(state), status=status, headers=headers,
+                    mimetype='application/json')
+
+
+def execute(environ, start_response):
+    # /rest/execute with the parameters (and responses) of restapi.Main
+    try:
+        with app.request_context(environ):
+            args = execute_arguments()
+    except HTTPException as e:
+        return json_response(getattr(e, 'data', None) or {'message': e.description},
+                             e.code)(environ, start_response)
+    url = args.url
+    request = dict(execute_options(args), url=url, domain=args.domain,
+                   semiotic_quality_flags=sorted(args.semiotic_quality_flags))
+
+    evaluation = gevent.spawn(evaluate, url, request)
+    client = environ.get('owlparser.socket') or environ.get('gunicorn.socket')
+    watcher = gevent.spawn(watch_client, client, evaluation) if client is not None else None
+    try:
+        reply = evaluation.get()
+    except Busy:
+        response = json_response({'message': 'Too many requests waiting; try again later'}, 503,
+                                 {'Retry-After': '5'})
+    except Exception as e:
+        response = json_response({'message': str(e)}, 500)
+    else:
+        if isinstance(reply, gevent.GreenletExit):
+            # the client is gone; nobody reads the response
+            return []
+        if 'error' in reply:
+            response = json_response({'message': reply['error']}, reply.get('status', 500))
+        else:
+            response = json_response(reply['result'])
+    finally:
+        if watcher is not None:
+            watcher.kill(block=False)
+    return response(environ, start_response)
+
+
+def application(environ, start_response):
+    # everything but /rest/execute is served by the Flask application, in
+    # this process
+    if environ.get('PATH_INFO') == '/rest/execute':
+        return execute(environ, start_response)
+    return app(environ, start_response)
+
+
+class Handler(WSGIHandler):
+
+    def get_environ(self):
+        environ = WSGIHandler.get_environ(self)
+        environ['owlparser.socket'] = self.socket
+        return environ
+
+
+def main():
+    port = int(os.environ.get('PORT', 5000))
+    print 'Serving on port {} with {} scoring processes'.format(port, WORKERS)
+    WSGIServer(('', port), application, handler_class=Handler).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- encoding: utf-8 -*-
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+
+from ontparser import parallel
+from ontparser.quality import owl_quality
+
+
+DEFAULT_TIMEOUT = int(os.environ.get('OWLPARSER_BATCH_TIMEOUT', 600))
+
+
+class Timeout(Exception):
+    pass
+
+
+def raise_timeout(signum, frame):
+    raise Timeout()
+
+
+def evaluate(item):
+    # Score one batch item in a pool process. Errors and timeouts are
+    # reported in the returned dict so one bad ontology does not end the
+    # batch.
+    index, url, semiotic_quality_flags, domain, already_converted, timeout = item
+    started = time.time()
+    outcome = {'index': index, 'url': url}
+    previous = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.alarm(timeout or 0)
+    try:
+        outcome['result'] = owl_quality(url, semiotic_quality_flags, domain,
+                                        already_converted=already_converted)
+    except Timeout:
+        outcome['error'] = 'Timed out after {} seconds'.format(timeout)
+    except Exception as e:
+        traceback.print_exc()
+        outcome['error'] = str(e)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+    outcome['seconds'] = round(time.time() - started, 3)
+    return outcome
+
+
+def run_batch(items, processes=None, timeout=DEFAULT_TIMEOUT):
+    # Score items, each a dict with url, semiotic_quality_flags and
+    # optionally domain, already_converted and timeout, across a pool of
+    # processes (one per core by default). Yields one outcome dict per item,
+    # in completion order; 'index' gives the item's position in items.
+    # Every process streams its download straight into the parser, so
+    # downloads in one process overlap parsing and scoring in the others.
+    tasks = [(index, item['url'], item['semiotic_quality_flags'], item.get('domain'),
+              item.get('already_converted', False), item.get('timeout', timeout))
+             for index, item in enumerate(items)]
+    if not tasks:
+        return
+    # forked from a server process that may be running other threads (jobs,
+    # requests), see parallel.start_pool
+    pool = parallel.start_pool(min(processes or multiprocessing.cpu_count(), len(tasks)))
+    try:
+        for outcome in pool.imap_unordered(evaluate, tasks):
+            yield outcome
+        pool.close()
+    finally:
+        # also reached when the consumer stops early (e.g. the client hung up)
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,166 @@
+# -*- encoding: utf-8 -*-
+import cPickle as pickle
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    # In-memory cache that evicts the least recently used entries once the
+    # summed weight of its values exceeds max_weight. By default every value
+    # weighs 1, so max_weight is simply the maximum number of entries.
+
+    def __init__(self, max_weight=128, weigh=None):
+        self.max_weight = max_weight
+        self.weigh = weigh or (lambda value: 1)
+        self.weight = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, weight = self._entries.pop(key)
+            self._entries[key] = (value, weight)
+            return value
+
+    def put(self, key, value):
+        weight = self.weigh(value)
+        with self._lock:
+            if key in self._entries:
+                self.weight -= self._entries.pop(key)[1]
+            if weight > self.max_weight:
+                return
+            self._entries[key] = (value, weight)
+            self.weight += weight
+            while self.weight > self.max_weight:
+                _, (_, evicted_weight) = self._entries.popitem(last=False)
+                self.weight -= evicted_weight
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def after_fork(self):
+        # in a forked process, where another thread may have held the lock
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache(object):
+    # Pickles values into one file per key under directory. Reads touch the
+    # file, so the oldest modification time marks the least recently used
+    # entry when the directory grows past max_entries.
+
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key)).hexdigest() + '.pickle')
+
+    def get(self, key, default=None):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as fileobj:
+                stored_key, value = pickle.load(fileobj)
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return default
+        if stored_key != key:
+            return default
+        return value
+
+    def put(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fileobj:
+                pickle.dump((key, value), fileobj, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self.path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith('.pickle')]
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                os.remove(os.path.join(self.directory, name))
+
+
+class TieredCache(object):
+    # Memory LRU in front of an optional disk cache. Disk hits are promoted
+    # into memory.
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        if value is None:
+            return default
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def after_fork(self):
+        self.memory.after_fork()
+
+
+def owl_weight(owl):
+    return len(owl.nodes) + len(owl.object_properties) + len(owl.data_properties) + len(owl.annotations)
+
+
+def create_cache(name, max_weight, weigh=None):
+    # OWLPARSER_CACHE_DIR enables the on-disk backend, one subdirectory per
+    # cache
+    memory = LRUCache(max_weight, weigh)
+    cache_dir = os.environ.get('OWLPARSER_CACHE_DIR')
+    if cache_dir:
+        max_entries = int(os.environ.get('OWLPARSER_CACHE_DISK_ENTRIES', 1024))
+        return TieredCache(memory, DiskCache(os.path.join(cache_dir, name), max_entries))
+    return TieredCache(memory)
+
+
+# parsed Owl graphs, bounded by the total number of entities they hold
+graphs = create_cache('graphs', int(os.environ.get('OWLPARSER_CACHE_ENTITIES', 2000000)), owl_weight)
+
+# final owl_quality metric dicts
+results = create_cache('results', int(os.environ.get('OWLPARSER_CACHE_RESULTS', 1024)))
@@ -0,0 +1,38 @@
+# -*- encoding: utf-8 -*-
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class Database(object):
+    # An SQLite file shared by threads and server processes. One connection
+    # per thread (and process: a forked child reconnects), in autocommit
+    # mode; writes go through transaction().
+
+    def __init__(self, path, schema):
+        self.path = path
+        self._local = threading.local()
+        self.connection().executescript(schema)
+
+    def connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            local.db.execute('PRAGMA journal_mode=WAL')
+            local.pid = os.getpid()
+        return local.db
+
+    @contextmanager
+    def transaction(self):
+        # Takes the write lock before the first read, so that what a writer
+        # reads cannot change before it writes (a deferred transaction would
+        # let two writers read the same row and both act on it).
+        db = self.connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+import json
+from array import array
+from itertools import islice
+
+# Records of a parsed class hierarchy: the class tree and the labeled and
+# unlabeled class lists. They are generated one at a time, so a large
+# hierarchy can be streamed (restapi.Hierarchy) or printed (the
+# OwlQuality.print_* reports) without being built first.
+
+SECTIONS = ('tree', 'labeled', 'unlabeled')
+
+# bytes of output gathered before a streamed response writes them out
+STREAM_CHUNK_SIZE = 65536
+
+# json.dumps with options builds an encoder per call
+encoder = json.JSONEncoder(sort_keys=True)
+
+
+def roots(graph):
+    # classes without superclasses, in declaration order
+    parent_offsets = graph.parent_offsets
+    return [node_id for node_id in xrange(len(graph))
+            if parent_offsets[node_id + 1] == parent_offsets[node_id]]
+
+
+def walk(graph, starts, max_depth=None, sweep=False):
+    # Depth-first, preorder walk of the hierarchy below each of starts,
+    # subclasses in declaration order, with an explicit stack.
+    # Yields (node_id, depth, parent_id, first) per visit (parent_id -1 for
+    # a start). A class reached again (through another superclass, or a
+    # cycle) has first False and its subclasses are not walked again, so
+    # a shared subtree appears once. Subclasses below max_depth are not
+    # walked; a class reached again at a smaller depth than it was first
+    # walked from has first True and is walked again from there, since
+    # max_depth cut its subtree shorter the first time. With sweep, classes
+    # not reached from starts (only reachable through a subclass cycle) are
+    # walked afterwards as starts of their own.
+    # depth each class was walked from, -1 until it is reached
+    walked = array('i', [-1]) * len(graph)
+    child_offsets = graph.child_offsets
+    child_ids = graph.child_ids
+
+    def from_start(start):
+        stack = [(start, 0, -1)]
+        while stack:
+            node_id, depth, parent_id = stack.pop()
+            shallowest = walked[node_id]
+            if shallowest >= 0 and (max_depth is None or depth >= shallowest):
+                yield node_id, depth, parent_id, False
+                continue
+            walked[node_id] = depth
+            yield node_id, depth, parent_id, True
+            if max_depth is None or depth < max_depth:
+                for child_id in reversed(child_ids[child_offsets[node_id]:
+                                                   child_offsets[node_id + 1]]):
+                    stack.append((child_id, depth + 1, node_id))
+
+    for start in starts:
+        for visit in from_start(start):
+            yield visit
+    if sweep:
+        for start in xrange(len(graph)):
+            if walked[start] < 0:
+                for visit in from_start(start):
+                    yield visit
+
+
+def tree(graph, root=None, max_depth=None, offset=0, limit=None):
+    # One record per visit of walk, from root (a class IRI; KeyError if it
+    # is not a class) or from every class without superclasses, skipping
+    # the first offset visits and stopping after limit. A repeated class is
+    # a reference, {"iri", "label", "depth", "parent", "ref": true}; its
+    # subclasses are under its first occurrence (or, with max_depth, under
+    # its shallowest).
+    if root is None:
+        visits = walk(graph, roots(graph), max_depth, sweep=max_depth is None)
+    else:
+        visits = walk(graph, [graph.ids[root]], max_depth)
+    iris = graph.iris
+    labels = graph.labels
+    wn_count = graph.wn_count
+    stop = None if limit is None else offset + limit
+    for node_id, depth, parent_id, first in islice(visits, offset, stop):
+        record = {
+            'iri': iris[node_id],
+            'label': labels[node_id],
+            'depth': depth,
+            'parent': iris[parent_id] if parent_id >= 0 else None,
+        }
+        if first:
+            record['wn_count'] = wn_count[node_id]
+            record['children'] = graph.num_children(node_id)
+        else:
+            record['ref'] = True
+        yield record
+
+
+def labeled(graph, offset=0, limit=None):
+    # {"iri", "label"} for each labeled class, by IRI
+    iris = graph.iris
+    labels = graph.labels
+    node_ids = sorted((node_id for node_id in xrange(len(graph)) if labels[node_id]),
+                      key=iris.__getitem__)
+    stop = None if limit is None else offset + limit
+    for node_id in islice(node_ids, offset, stop):
+        yield {'iri': iris[node_id], 'label': labels[node_id]}
+
+
+def unlabeled(graph, offset=0, limit=None):
+    # {"iri"} for each unlabeled class, by IRI
+    labels = graph.labels
+    node_iris = sorted(iri for node_id, iri in enumerate(graph.iris) if not labels[node_id])
+    stop = None if limit is None else offset + limit
+    for iri in islice(node_iris, offset, stop):
+        yield {'iri': iri}
+
+
+def ndjson(records):
+    for record in records:
+        yield encoder.encode(record) + '\n'
+
+
+def json_list(records):
+    # the records as one JSON list, written an element at a time
+    separator = '['
+    for record in records:
+        yield separator + encoder.encode(record)
+        separator = ',\n'
+    yield '[]\n' if separator == '[' else ']\n'
+
+
+def chunked(pieces, size=STREAM_CHUNK_SIZE):
+    # gather small pieces of output into chunks of about size bytes
+    buffered = []
+    length = 0
+    for piece in pieces:
+        buffered.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffered)
+            buffered = []
+            length = 0
+    if buffered:
+        yield ''.join(buffered)
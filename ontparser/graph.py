@@ -0,0 +1,172 @@
+# -*- encoding: utf-8 -*-
+from array import array
+from collections import Mapping
+from itertools import izip
+
+
+class Graph(object):
+    # Class hierarchy of an ontology. Each class IRI is interned once and
+    # identified by an integer id; labels and per-class metrics are stored
+    # as columns indexed by id, and parent/child edges as CSR adjacency
+    # arrays: the parents of class i are
+    # parent_ids[parent_offsets[i]:parent_offsets[i + 1]].
+
+    def __init__(self):
+        self.iris = []
+        self.ids = {}
+        self.labels = []
+        self._edges = array('i')  # (subclass, superclass) pairs until freeze()
+        self.parent_offsets = array('i', [0])
+        self.parent_ids = array('i')
+        self.child_offsets = array('i', [0])
+        self.child_ids = array('i')
+        self.max_depth = array('i')
+        self.root_node = bytearray()
+        self.wn_count = array('i')
+        self.depths = None  # DepthResult, once computed
+
+    def __len__(self):
+        return len(self.iris)
+
+    def add(self, iri):
+        node_id = self.ids.get(iri)
+        if node_id is None:
+            node_id = self.ids[iri] = len(self.iris)
+            self.iris.append(iri)
+            self.labels.append(None)
+            self.wn_count.append(0)
+        return node_id
+
+    def add_edge(self, subclass_iri, superclass_iri):
+        superclass_id = self.add(superclass_iri)
+        subclass_id = self.add(subclass_iri)
+        self._edges.append(subclass_id)
+        self._edges.append(superclass_id)
+
+    def freeze(self):
+        # build the adjacency arrays with a counting sort of the edge list,
+        # which keeps parents and children in the order they were declared
+        n = len(self.iris)
+        edges = self._edges
+        self.parent_offsets, self.parent_ids = csr(n, edges[0::2], edges[1::2])
+        self.child_offsets, self.child_ids = csr(n, edges[1::2], edges[0::2])
+        self._edges = array('i')
+        self.max_depth = array('i', [0]) * n
+        self.root_node = bytearray(n)
+
+    def parents(self, node_id):
+        return self.parent_ids[self.parent_offsets[node_id]:self.parent_offsets[node_id + 1]]
+
+    def children(self, node_id):
+        return self.child_ids[self.child_offsets[node_id]:self.child_offsets[node_id + 1]]
+
+    def num_parents(self, node_id):
+        return self.parent_offsets[node_id + 1] - self.parent_offsets[node_id]
+
+    def num_children(self, node_id):
+        return self.child_offsets[node_id + 1] - self.child_offsets[node_id]
+
+    def text(self, node_id):
+        # what unicode(node) shows: the label, or the IRI if unlabeled
+        label = self.labels[node_id]
+        if label is None:
+            return self.iris[node_id]
+        return label
+
+    def node(self, node_id):
+        return NodeView(self, node_id)
+
+    @property
+    def nodes(self):
+        return NodeMap(self)
+
+
+def csr(n, sources, targets):
+    offsets = array('i', [0]) * (n + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in xrange(n):
+        offsets[i + 1] += offsets[i]
+    position = array('i', offsets)
+    adjacent = array('i', [0]) * len(targets)
+    for source, target in izip(sources, targets):
+        adjacent[position[source]] = target
+        position[source] += 1
+    return offsets, adjacent
+
+
+class NodeView(object):
+    # Node-like view of one class in a Graph
+
+    __slots__ = ('graph', 'id')
+
+    def __init__(self, graph, node_id):
+        self.graph = graph
+        self.id = node_id
+
+    @property
+    def iri(self):
+        return self.graph.iris[self.id]
+
+    @property
+    def label(self):
+        return self.graph.labels[self.id]
+
+    @label.setter
+    def label(self, value):
+        self.graph.labels[self.id] = value
+
+    @property
+    def parents(self):
+        iris = self.graph.iris
+        return [iris[i] for i in self.graph.parents(self.id)]
+
+    @property
+    def children(self):
+        iris = self.graph.iris
+        return [iris[i] for i in self.graph.children(self.id)]
+
+    @property
+    def max_depth(self):
+        return self.graph.max_depth[self.id]
+
+    @property
+    def root_node(self):
+        return bool(self.graph.root_node[self.id])
+
+    @property
+    def wn_count(self):
+        return self.graph.wn_count[self.id]
+
+    def __unicode__(self):
+        return self.graph.text(self.id)
+
+    def __str__(self):
+        return self.__unicode__().encode('utf-8')
+
+
+class NodeMap(Mapping):
+    # Read-only {iri: node} view over a Graph, standing in for the dict of
+    # Node objects Owl used to build
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, iri):
+        return NodeView(self.graph, self.graph.ids[iri])
+
+    def __contains__(self, iri):
+        return iri in self.graph.ids
+
+    def __iter__(self):
+        return iter(self.graph.iris)
+
+    def __len__(self):
+        return len(self.graph.iris)
+
+    def itervalues(self):
+        graph = self.graph
+        return (NodeView(graph, node_id) for node_id in xrange(len(graph)))
+
+    def iteritems(self):
+        return izip(self.graph.iris, self.itervalues())
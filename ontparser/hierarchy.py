@@ -0,0 +1,99 @@
+# -*- encoding: utf-8 -*-
+from array import array
+from collections import deque
+
+import numpy as np
+
+from ontparser import analytics
+
+
+class DepthResult(object):
+
+    def __init__(self, leaf_nodes, root_nodes, cycle_nodes):
+        # ids of classes without children and without parents
+        self.leaf_nodes = leaf_nodes
+        self.root_nodes = root_nodes
+        # ids of classes where a subclass cycle had to be broken to continue
+        self.cycle_nodes = cycle_nodes
+
+
+def compute_depths(graph):
+    # One topological pass (Kahn's algorithm) from the roots down. The
+    # max_depth of a class is the length of the longest path to any root,
+    # which is what the old recursive get_max_depth computed for leaves,
+    # but each class and edge is visited once. Fills the graph's max_depth
+    # and root_node columns. Without subclass cycles this is done a level
+    # at a time with NumPy (analytics.levels), with the same result.
+    depth = analytics.levels(graph)
+    if depth is not None:
+        graph.max_depth[:] = array('i', depth.tostring())
+        roots = np.diff(analytics.column(graph.parent_offsets)) == 0
+        graph.root_node[:] = bytearray(roots.astype(np.uint8).tostring())
+        leaves = np.diff(analytics.column(graph.child_offsets)) == 0
+        return DepthResult(np.flatnonzero(leaves).tolist(), np.flatnonzero(roots).tolist(), [])
+
+    n = len(graph)
+    parent_offsets = graph.parent_offsets
+    parent_ids = graph.parent_ids
+    child_offsets = graph.child_offsets
+    child_ids = graph.child_ids
+    max_depth = graph.max_depth
+    root_node = graph.root_node
+
+    pending = array('i', [0]) * n
+    queue = deque()
+    leaf_nodes = []
+    root_nodes = []
+    for node_id in xrange(n):
+        max_depth[node_id] = 0
+        pending[node_id] = parent_offsets[node_id + 1] - parent_offsets[node_id]
+        root_node[node_id] = not pending[node_id]
+        if root_node[node_id]:
+            root_nodes.append(node_id)
+            queue.append(node_id)
+        if child_offsets[node_id + 1] == child_offsets[node_id]:
+            leaf_nodes.append(node_id)
+
+    cycle_nodes = []
+    # classes with some, but not all, parents placed; a stalled pass breaks
+    # cycles here first so the cycle hangs below the rest of the hierarchy
+    partial = deque()
+    unresolved = 0
+    resolved = 0
+    while resolved < n:
+        if not queue:
+            # every remaining class sits on or below a subclass cycle; break
+            # it at an unresolved class, giving it the depth its
+            # already-placed parents imply
+            node_id = None
+            while partial and node_id is None:
+                candidate = partial.popleft()
+                if pending[candidate] > 0:
+                    node_id = candidate
+            if node_id is None:
+                while pending[unresolved] <= 0:
+                    unresolved += 1
+                node_id = unresolved
+            max_depth[node_id] = max(
+                [max_depth[p] + 1 for p in graph.parents(node_id) if pending[p] == 0] or [0])
+            pending[node_id] = 0
+            cycle_nodes.append(node_id)
+            queue.append(node_id)
+
+        node_id = queue.popleft()
+        resolved += 1
+        depth = max_depth[node_id] + 1
+        for i in xrange(child_offsets[node_id], child_offsets[node_id + 1]):
+            child_id = child_ids[i]
+            if pending[child_id] <= 0:
+                # child was already placed by breaking a cycle
+                continue
+            if depth > max_depth[child_id]:
+                max_depth[child_id] = depth
+            pending[child_id] -= 1
+            if pending[child_id] == 0:
+                queue.append(child_id)
+            else:
+                partial.append(child_id)
+
+    return DepthResult(leaf_nodes, root_nodes, cycle_nodes)
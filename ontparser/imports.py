@@ -0,0 +1,158 @@
+# -*- encoding: utf-8 -*-
+import hashlib
+import os
+import threading
+import time
+from itertools import izip
+from multiprocessing.pool import ThreadPool
+
+from ontparser import parallel
+from ontparser.graph import Graph
+from ontparser.tally import Tally
+
+# imported ontologies fetched and parsed at once, per closure
+WORKERS = int(os.environ.get('OWLPARSER_IMPORT_WORKERS', 4))
+# most ontologies one closure may import, directly or not
+MAX_IMPORTS = int(os.environ.get('OWLPARSER_MAX_IMPORTS', 64))
+
+
+class Resolver(object):
+    # Loads the import closure of an ontology on a pool of threads. Each
+    # import is submitted as soon as it is known, which for a document
+    # being parsed is when its import is read (pass submit as the parse's
+    # on_import), and is loaded with load(iri, on_import), so the imports
+    # of imports are found the same way. Only http(s) IRIs are fetched.
+
+    def __init__(self, load, workers=None, url=None):
+        self.load = load
+        self.pool = ThreadPool(workers or WORKERS)
+        self._lock = threading.Lock()
+        # iri -> AsyncResult, or the error if it was not submitted
+        self._pending = {}
+        self._order = []
+        self._submitted = 0
+        self._seen = {url} if url else set()
+
+    def submit(self, iri):
+        with self._lock:
+            if iri in self._seen:
+                return
+            self._seen.add(iri)
+            self._order.append(iri)
+            if not iri.startswith(('http://', 'https://')):
+                self._pending[iri] = 'Not an http(s) IRI'
+            elif self._submitted >= MAX_IMPORTS:
+                self._pending[iri] = 'More than {} imports'.format(MAX_IMPORTS)
+            else:
+                self._submitted += 1
+                self._pending[iri] = self.pool.apply_async(self.load_import, (iri,))
+
+    def load_import(self, iri):
+        owl = self.load(iri, self.submit)
+        # a cached parse reported none of its imports
+        for imported in owl.imports:
+            self.submit(imported)
+        return owl
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def results(self):
+        # Waits for the whole closure. Returns the loaded ontologies in the
+        # order their imports were found, and {iri: error} for the imports
+        # that could not be loaded.
+        loaded = []
+        failed = {}
+        position = 0
+        try:
+            # an import is only waited for once every import found before
+            # it has finished, so the imports it found are listed by then
+            while position < len(self._order):
+                iri = self._order[position]
+                position += 1
+                pending = self._pending[iri]
+                if isinstance(pending, basestring):
+                    failed[iri] = pending
+                    continue
+                try:
+                    loaded.append(pending.get())
+                except Exception as e:
+                    failed[iri] = str(e)
+        finally:
+            self.close()
+        return loaded, failed
+
+
+def content_hash(sources):
+    # of a closure, from the ontologies in it
+    return hashlib.md5(' '.join(source.url + ' ' + source.content_hash
+                                for source in sources)).hexdigest()
+
+
+class Closure(object):
+    # An ontology merged with the ontologies it imports, with the parts of
+    # an Owl that OwlQuality reads. Classes, properties and annotation
+    # properties are merged by IRI, the importing ontology first: a class
+    # keeps the first label it has, and a subclass edge declared in several
+    # ontologies counts once. Comment counts are summed over the distinct
+    # documents, and the WordNet counts are taken over the merged labels.
+
+    def __init__(self, owl, imported, domain_terms=(), processes=0, wordnet=True):
+        self.url = owl.url
+        self.already_converted = owl.already_converted
+        self.content_hash = content_hash([owl] + imported)
+        # the same document may be imported under several IRIs (the
+        # importing one included)
+        sources = []
+        hashes = set()
+        for source in [owl] + imported:
+            if source.content_hash not in hashes:
+                hashes.add(source.content_hash)
+                sources.append(source)
+        self.wordnet = wordnet
+        self.imports = owl.imports
+        self.elements = sum(source.elements for source in sources)
+
+        graph = self.graph = Graph()
+        labels = graph.labels
+        for source in sources:
+            for iri, label in izip(source.graph.iris, source.graph.labels):
+                node_id = graph.add(iri)
+                if labels[node_id] is None:
+                    labels[node_id] = label
+        edges = set()
+        for source in sources:
+            source_graph = source.graph
+            iris = source_graph.iris
+            for node_id in xrange(len(source_graph)):
+                for parent_id in source_graph.parents(node_id):
+                    edge = (iris[node_id], iris[parent_id])
+                    if edge not in edges:
+                        edges.add(edge)
+                        graph.add_edge(*edge)
+        del edges
+        graph.freeze()
+
+        for name in ('object_properties', 'data_properties', 'annotations'):
+            merged = {}
+            for source in reversed(sources):
+                merged.update(getattr(source, name))
+            setattr(self, name, merged)
+
+        tally = self.tally = Tally(graph, domain_terms, wordnet=False)
+        for source in sources:
+            tally.comment_count += source.tally.comment_count
+            tally.comment_length += source.tally.comment_length
+        # every source counted (or can count) the domain terms
+        for term in tally.terms:
+            tally.comment_matches[term] = sum(source.tally.comment_hits([term])
+                                              for source in sources)
+        if wordnet:
+            started = time.time()
+            tally.count_labels(parallel.wordnet_lookup(labels, processes))
+            tally.wordnet_seconds = time.time() - started
+
+    @property
+    def nodes(self):
+        return self.graph.nodes
@@ -0,0 +1,154 @@
+# -*- encoding: utf-8 -*-
+import os
+import resource
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+# ru_maxrss is in kilobytes on Linux (bytes on macOS)
+MAXRSS_SCALE = 1 if os.uname()[0] == 'Darwin' else 1024
+
+
+def resident_bytes():
+    # current resident set size, or None where /proc is not available
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (IOError, IndexError, ValueError):
+        return None
+
+
+def peak_resident_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_SCALE
+
+
+def megabytes(value):
+    return None if value is None else round(value / 1048576.0, 1)
+
+
+class Profile(object):
+    # Phase timers, counters and memory samples for one owl_quality call.
+    # A phase may be entered more than once; its times add up. Resident
+    # memory is sampled at the end of every phase.
+
+    def __init__(self):
+        self.started = time.time()
+        self.seconds = OrderedDict()
+        self.counters = OrderedDict()
+        self.resident = OrderedDict()
+        self.cached = {'parse': False, 'snapshot': False, 'result': False}
+        self.trace = None
+
+    @contextmanager
+    def phase(self, name):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.time(name, time.time() - started)
+            self.resident[name] = resident_bytes()
+
+    def time(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def add(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self, error=False):
+        self.time('total', time.time() - self.started)
+        metrics.record(self, error)
+
+    def summary(self):
+        return ' '.join('%s=%.3fs' % item for item in self.seconds.iteritems()) + ' ' + \
+            ' '.join('%s=%d' % item for item in self.counters.iteritems())
+
+    def as_dict(self):
+        state = {
+            'seconds': OrderedDict((name, round(seconds, 6))
+                                   for name, seconds in self.seconds.iteritems()),
+            'counters': self.counters,
+            'cached': self.cached,
+            'memory': {
+                'resident_megabytes': OrderedDict((name, megabytes(value))
+                                                  for name, value in self.resident.iteritems()),
+                'peak_resident_megabytes': megabytes(peak_resident_bytes()),
+            },
+        }
+        if self.trace:
+            state['trace'] = self.trace
+        return state
+
+
+class Metrics(object):
+    # Process-wide totals of every finished Profile, rendered in the
+    # Prometheus text exposition format. Each gunicorn worker keeps its own
+    # totals, so every sample carries a worker label.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.evaluations = defaultdict(int)
+        self.phase_seconds = defaultdict(float)
+        self.phase_count = defaultdict(int)
+        self.counters = defaultdict(float)
+
+    def after_fork(self):
+        # in a forked process, where another thread may have held the lock
+        self._lock = threading.Lock()
+
+    def record(self, profile, error=False):
+        with self._lock:
+            outcome = 'error' if error else 'cached' if profile.cached['result'] else 'computed'
+            self.evaluations[outcome] += 1
+            for name, seconds in profile.seconds.iteritems():
+                self.phase_seconds[name] += seconds
+                self.phase_count[name] += 1
+            for name, value in profile.counters.iteritems():
+                self.counters[name] += value
+
+    def render(self):
+        worker = 'worker="%d"' % os.getpid()
+        lines = []
+
+        def sample(name, value, labels=''):
+            lines.append('%s{%s} %s' % (name, ','.join(filter(None, (worker, labels))), repr(float(value))))
+
+        with self._lock:
+            lines.append('# HELP owlparser_evaluations_total Ontology evaluations by outcome.')
+            lines.append('# TYPE owlparser_evaluations_total counter')
+            for outcome in sorted(self.evaluations):
+                sample('owlparser_evaluations_total', self.evaluations[outcome], 'outcome="%s"' % outcome)
+            lines.append('# HELP owlparser_phase_seconds Time spent in each evaluation phase.')
+            lines.append('# TYPE owlparser_phase_seconds summary')
+            for phase in sorted(self.phase_seconds):
+                sample('owlparser_phase_seconds_sum', self.phase_seconds[phase], 'phase="%s"' % phase)
+                sample('owlparser_phase_seconds_count', self.phase_count[phase], 'phase="%s"' % phase)
+            for name in sorted(self.counters):
+                lines.append('# TYPE owlparser_%s_total counter' % name)
+                sample('owlparser_%s_total' % name, self.counters[name])
+        resident = resident_bytes()
+        if resident is not None:
+            lines.append('# TYPE process_resident_memory_bytes gauge')
+            sample('process_resident_memory_bytes', resident)
+        lines.append('# TYPE owlparser_peak_resident_memory_bytes gauge')
+        sample('owlparser_peak_resident_memory_bytes', peak_resident_bytes())
+        return '\n'.join(lines) + '\n'
+
+
+def dump_trace(tracer, directory):
+    # write cProfile stats (pstats format; flameprof or gprof2dot turn them
+    # into flame graphs) and return the file name
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, 'owlparser-%s-%d.prof' % (
+        time.strftime('%Y%m%dT%H%M%S', time.gmtime()), os.getpid()))
+    tracer.dump_stats(path)
+    return path
+
+
+metrics = Metrics()
@@ -0,0 +1,229 @@
+# -*- encoding: utf-8 -*-
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from Queue import Queue
+
+from ontparser.database import Database
+from ontparser.quality import owl_quality
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# byte counters are written to the store at most this often (phase changes
+# always are)
+REPORT_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    active INTEGER NOT NULL,
+    finished REAL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS active_jobs ON jobs (key) WHERE active;
+CREATE INDEX IF NOT EXISTS finished_jobs ON jobs (finished) WHERE NOT active;
+"""
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class JobStore(Database):
+    # The state of every job (as Job.as_dict) in an SQLite file, so that any
+    # server process can answer a poll, and a submission matching a queued
+    # or running job in any process returns that job. A job is active while
+    # queued or running; the process running it is recorded, and an active
+    # job whose process has exited is failed when next read.
+
+    def __init__(self, path):
+        Database.__init__(self, path, SCHEMA)
+
+    def add(self, job):
+        # job, or the active job with the same key (as a state dict); the
+        # first element says whether job was added
+        with self.transaction() as db:
+            row = db.execute('SELECT id, pid, state FROM jobs WHERE key = ? AND active',
+                             (job.key,)).fetchone()
+            if row is not None:
+                if alive(row[1]):
+                    return False, json.loads(row[2])
+                self.orphan(db, row[0], json.loads(row[2]))
+            db.execute('INSERT INTO jobs VALUES (?, ?, ?, 1, NULL, ?)',
+                       (job.id, job.key, os.getpid(), json.dumps(job.as_dict())))
+        return True, job.as_dict()
+
+    def save(self, job):
+        finished = job.status in (DONE, FAILED)
+        self.connection().execute('UPDATE jobs SET active = ?, finished = ?, state = ? WHERE id = ?',
+                                  (not finished, job.finished, json.dumps(job.as_dict()), job.id))
+
+    def get(self, job_id):
+        row = self.connection().execute('SELECT pid, active, state FROM jobs WHERE id = ?',
+                                        (job_id,)).fetchone()
+        if row is None:
+            return None
+        pid, active, state = row
+        state = json.loads(state)
+        if active and not alive(pid):
+            with self.transaction() as db:
+                state = self.orphan(db, job_id, state)
+        return state
+
+    def orphan(self, db, job_id, state):
+        state.update(status=FAILED, error='The server process running the job exited',
+                     finished=time.time())
+        db.execute('UPDATE jobs SET active = 0, finished = ?, state = ? WHERE id = ?',
+                   (state['finished'], json.dumps(state), job_id))
+        return state
+
+    def prune(self, max_finished):
+        self.connection().execute(
+            'DELETE FROM jobs WHERE NOT active AND id NOT IN '
+            '(SELECT id FROM jobs WHERE NOT active ORDER BY finished DESC LIMIT ?)',
+            (max_finished,))
+
+
+class Job(object):
+    # One owl_quality evaluation run by a JobQueue worker. Workers update
+    # the phase and byte counters through report() while the job runs, and
+    # each change of state is saved to the store.
+
+    def __init__(self, store, key, url, semiotic_quality_flags, domain, already_converted):
+        self.store = store
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.url = url
+        self.semiotic_quality_flags = semiotic_quality_flags
+        self.domain = domain
+        self.already_converted = already_converted
+        self.status = QUEUED
+        self.phase = None
+        self.bytes_read = 0
+        self.bytes_total = None
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.saved = 0.0
+
+    def report(self, phase, bytes_read=None, bytes_total=None):
+        changed = phase != self.phase
+        self.phase = phase
+        if bytes_read is not None:
+            self.bytes_read = bytes_read
+            self.bytes_total = bytes_total
+        if changed or time.time() - self.saved >= REPORT_INTERVAL:
+            self.save()
+
+    def save(self):
+        self.saved = time.time()
+        self.store.save(self)
+
+    def run(self):
+        self.status = RUNNING
+        self.started = time.time()
+        self.save()
+        try:
+            self.result = owl_quality(self.url, self.semiotic_quality_flags, self.domain,
+                                      already_converted=self.already_converted,
+                                      progress=self.report)
+            self.status = DONE
+        except Exception as e:
+            traceback.print_exc()
+            self.error = str(e)
+            self.status = FAILED
+        self.finished = time.time()
+        self.save()
+
+    def as_dict(self):
+        state = {
+            'id': self.id,
+            'url': self.url,
+            'status': self.status,
+            'phase': self.phase,
+            'bytes_read': self.bytes_read,
+            'bytes_total': self.bytes_total,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if self.status == DONE:
+            state['result'] = self.result
+        elif self.status == FAILED:
+            state['error'] = self.error
+        return state
+
+
+class JobQueue(object):
+    # Runs the jobs submitted to this process on a fixed number of worker
+    # threads, keeping their states in a JobStore shared with the other
+    # server processes. A submission that matches a queued or running job
+    # returns that job instead of starting another evaluation of the same
+    # ontology. Finished jobs are kept for polling until more than
+    # max_finished have accumulated. Threads are started on first use, so
+    # that they are created in each server worker process rather than in a
+    # pre-fork parent.
+
+    def __init__(self, store, workers=2, max_finished=1000):
+        self.store = store
+        self.workers = workers
+        self.max_finished = max_finished
+        self._queue = Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, url, semiotic_quality_flags, domain=None, already_converted=False):
+        # the state of the new (or matching) job
+        key = json.dumps([url, bool(already_converted), domain or None,
+                          sorted(semiotic_quality_flags)])
+        job = Job(self.store, key, url, semiotic_quality_flags, domain, already_converted)
+        added, state = self.store.add(job)
+        if added:
+            self._start()
+            self._queue.put(job)
+        return state
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work,
+                                          name='owlparser-job-%d' % len(self._threads))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.run()
+            self.store.prune(self.max_finished)
+
+
+# Where job states are kept. Without OWLPARSER_JOB_STORE, a file named for
+# the process that loads the application: under gunicorn with preload_app
+# (gunicorn.conf.py) that is the master, so every worker shares it.
+store_path = os.environ.get('OWLPARSER_JOB_STORE') or os.path.join(
+    tempfile.gettempdir(), 'owlparser-jobs-{}.db'.format(os.getpid()))
+
+jobs = JobQueue(JobStore(store_path), int(os.environ.get('OWLPARSER_JOB_WORKERS', 2)),
+                int(os.environ.get('OWLPARSER_JOBS_KEPT', 1000)))
@@ -0,0 +1,101 @@
+# -*- encoding: utf-8 -*-
+import os
+import threading
+
+from ontparser.cache import LRUCache
+
+# we put the nltk data in a non-standard location, which requires that
+# we set an environment variable indicating where the data will be
+# found:
+script_dir = os.path.dirname(os.path.realpath(__file__))
+os.environ['NLTK_DATA'] = os.path.join(script_dir, '..', 'nltk_data')
+
+# the WordNet corpus reader, once corpus() has imported it
+wn = None
+
+
+def corpus():
+    # importing nltk takes about a second, so runs that never look up a
+    # label (see owl_quality's wordnet argument) do not import it at all
+    global wn
+    if wn is None:
+        from nltk.corpus import wordnet
+        wn = wordnet
+    return wn
+
+
+class WordNetEntry(object):
+    # count is the number of synsets for a label, names the distinct synset
+    # head words in WordNet order (e.g. 'time' for time.n.01)
+    __slots__ = ('count', 'names')
+
+    def __init__(self, count, names):
+        self.count = count
+        self.names = names
+
+
+EMPTY_ENTRY = WordNetEntry(0, ())
+
+
+class WordNetLookup(object):
+    # Resolves each distinct label once per process. Labels are normalized
+    # the same way wn.synsets normalizes them, so the cache never changes a
+    # result. The nltk reader seeks and reads one shared handle per data
+    # file, so lookups that miss the cache take turns (threads hold the
+    # lock, and a forked process opens its own handles: after_fork).
+
+    def __init__(self, max_entries=100000):
+        self.cache = LRUCache(max_entries)
+        self._lock = threading.Lock()
+
+    def lookup(self, label):
+        if not label:
+            return EMPTY_ENTRY
+        key = label.lower()
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = self.resolve(key)
+            self.cache.put(key, entry)
+        return entry
+
+    def resolve(self, key):
+        # uncached lookup of a lower-cased label
+        with self._lock:
+            synsets = corpus().synsets(key)
+            names = []
+            for synset in synsets:
+                name = synset.name().partition('.')[0]
+                if name not in names:
+                    names.append(name)
+        return WordNetEntry(len(synsets), tuple(names)) if synsets else EMPTY_ENTRY
+
+    def lookup_many(self, labels):
+        # returns {label: WordNetEntry}, looking up repeated labels once
+        entries = {}
+        for label in labels:
+            if label not in entries:
+                entries[label] = self.lookup(label)
+        return entries
+
+    def preload(self, labels=()):
+        # load the WordNet index files now instead of inside the first
+        # request, then warm the cache with any known labels
+        with self._lock:
+            corpus().ensure_loaded()
+        for label in labels:
+            self.lookup(label)
+
+    def after_fork(self):
+        # In a forked process: the data file handles share their offsets
+        # with the parent's, so reopen them, and drop a lock another thread
+        # of the parent may have held at the fork.
+        self._lock = threading.Lock()
+        self.cache.after_fork()
+        if wn is not None:
+            # a LazyCorpusLoader takes the reader's __dict__ once loaded
+            data_files = wn.__dict__.get('_data_file_map')
+            if data_files:
+                data_files.clear()
+
+
+wordnet = WordNetLookup(int(os.environ.get('OWLPARSER_WORDNET_CACHE', 100000)))
@@ -0,0 +1,18 @@
+# -*- encoding: utf-8 -*-
+import os
+
+# Parse limits, 0 for none. A document over a limit fails with
+# LimitExceeded as soon as the limit is crossed, instead of the process
+# parsing it running out of memory.
+
+# bytes of the document, as read (before any decoding)
+MAX_DOCUMENT_BYTES = int(os.environ.get('OWLPARSER_MAX_DOCUMENT_BYTES', 0))
+# axioms, triples or stanzas handled (Owl.elements), and XML elements held
+# at once for one RDF/XML node element
+MAX_ELEMENTS = int(os.environ.get('OWLPARSER_MAX_ELEMENTS', 0))
+# characters in one label or comment, OBO line or Turtle token
+MAX_TEXT_LENGTH = int(os.environ.get('OWLPARSER_MAX_TEXT_LENGTH', 0))
+
+
+class LimitExceeded(RuntimeError):
+    pass
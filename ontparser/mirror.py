@@ -0,0 +1,130 @@
+# -*- encoding: utf-8 -*-
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DOWNLOAD_CHUNK_SIZE = 65536
+
+
+def create_session(pool_size=16):
+    # one keep-alive connection pool per host, shared by every download
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
+
+POOL_SIZE = int(os.environ.get('OWLPARSER_HTTP_POOL_SIZE', 16))
+session = create_session(POOL_SIZE)
+
+
+class Mirror(object):
+    # On-disk copies of remote ontologies. Each url is stored (decoded, if
+    # the server compressed it) as <sha1 of url>.data, with its validators
+    # in <sha1>.json; both are written to a temporary file and renamed into
+    # place. A copy younger than max_age seconds is used as is, an older one
+    # is revalidated with a conditional GET.
+
+    def __init__(self, directory, max_age=0, session=session):
+        self.directory = directory
+        self.max_age = max_age
+        self.session = session
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def paths(self, url):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return (os.path.join(self.directory, name + '.data'),
+                os.path.join(self.directory, name + '.json'))
+
+    def lock(self, url):
+        # one download per url at a time
+        with self._locks_lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def read_meta(self, url):
+        data_path, meta_path = self.paths(url)
+        if not os.path.exists(data_path):
+            return None
+        try:
+            with open(meta_path) as meta_file:
+                return json.load(meta_file)
+        except (IOError, ValueError):
+            return None
+
+    def write(self, path, chunks):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+            os.rename(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def fetch(self, url, force=False):
+        # returns the path of an up-to-date local copy of url
+        data_path, meta_path = self.paths(url)
+        with self.lock(url):
+            meta = None if force else self.read_meta(url)
+            if meta is not None and time.time() - meta['checked'] < self.max_age:
+                return data_path
+            headers = {}
+            if meta is not None:
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+            with closing(self.session.get(url, headers=headers, stream=True)) as response:
+                if response.status_code == 304 and meta is not None:
+                    meta['checked'] = time.time()
+                elif response.status_code == 200:
+                    # iter_content undoes gzip/deflate content encoding
+                    self.write(data_path, response.iter_content(DOWNLOAD_CHUNK_SIZE))
+                    meta = {
+                        'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'content_type': response.headers.get('Content-Type'),
+                        'fetched': time.time(),
+                        'checked': time.time(),
+                    }
+                else:
+                    raise RuntimeError('{} {} fetching {}'.format(
+                        response.status_code, response.reason, url))
+            self.write(meta_path, [json.dumps(meta)])
+        return data_path
+
+
+def create_mirror():
+    directory = os.environ.get('OWLPARSER_MIRROR_DIR')
+    if not directory:
+        return None
+    return Mirror(directory, float(os.environ.get('OWLPARSER_MIRROR_MAX_AGE', 0)))
+
+
+mirror = create_mirror()
+
+
+def after_fork():
+    # In a forked process: open new connections instead of sharing the
+    # parent's sockets, and drop the download locks, which another thread
+    # of the parent may have held at the fork.
+    global session
+    session = create_session(POOL_SIZE)
+    if mirror is not None:
+        mirror.session = session
+        mirror._locks = {}
+        mirror._locks_lock = threading.Lock()
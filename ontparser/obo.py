@@ -0,0 +1,125 @@
+# -*- encoding: utf-8 -*-
+import re
+
+from ontparser import limits
+from ontparser.streams import iter_lines
+
+OBO_PURL = 'http://purl.obolibrary.org/obo/'
+
+# OBO tags that become annotation assertions in the standard OBO to OWL
+# mapping, by the abbreviated annotation property IRI they map to
+ANNOTATION_TAGS = {
+    'def': 'obo:IAO_0000115',
+    'alt_id': 'oboInOwl:hasAlternativeId',
+    'namespace': 'oboInOwl:hasOBONamespace',
+    'subset': 'oboInOwl:inSubset',
+    'xref': 'oboInOwl:hasDbXref',
+    'created_by': 'oboInOwl:created_by',
+    'creation_date': 'oboInOwl:creation_date',
+    'is_obsolete': 'owl:deprecated',
+    'replaced_by': 'obo:IAO_0100001',
+    'consider': 'oboInOwl:consider',
+}
+SYNONYM_SCOPES = {
+    'EXACT': 'oboInOwl:hasExactSynonym',
+    'BROAD': 'oboInOwl:hasBroadSynonym',
+    'NARROW': 'oboInOwl:hasNarrowSynonym',
+    'RELATED': 'oboInOwl:hasRelatedSynonym',
+}
+
+QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"\s*(\S*)')
+TRAILING = re.compile(r'\s*(?:\{[^}]*\})?\s*(?:(?<!\\)!.*)?$')
+ESCAPE = re.compile(r'\\(.)')
+ESCAPED_CHARS = {'n': '\n', 't': '\t', 'W': ' '}
+
+
+def unescape(value):
+    return ESCAPE.sub(lambda m: ESCAPED_CHARS.get(m.group(1), m.group(1)), value)
+
+
+class OboParser(object):
+    # Streaming OBO 1.2/1.4 front end. Stanzas are read one at a time and
+    # reported to Owl as soon as they end.
+
+    def __init__(self, owl):
+        self.owl = owl
+        self.ontology = None
+
+    def iri(self, identifier):
+        # GO:0000001 -> http://purl.obolibrary.org/obo/GO_0000001; unprefixed
+        # relation ids live under the ontology (obo/envo#part_of)
+        if identifier.startswith(('http://', 'https://')):
+            return identifier
+        prefix, colon, local = identifier.partition(':')
+        if colon:
+            return OBO_PURL + prefix + '_' + local
+        return OBO_PURL + (self.ontology or 'ontology') + '#' + identifier
+
+    def parse(self, chunks):
+        stanza = None
+        tags = []
+        for line in iter_lines(chunks, max_length=limits.MAX_TEXT_LENGTH):
+            line = line.strip()
+            if not line or line.startswith('!'):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                self.stanza(stanza, tags)
+                stanza = line[1:-1].strip()
+                tags = []
+                continue
+            tag, colon, value = line.partition(':')
+            if not colon:
+                continue
+            tag = tag.strip()
+            value = value.strip()
+            if stanza is None:
+                if tag == 'ontology':
+                    self.ontology = value
+                elif tag == 'import':
+                    self.owl.add_import(strip_trailing(value))
+            else:
+                tags.append((tag, value))
+        self.stanza(stanza, tags)
+
+    def stanza(self, stanza, tags):
+        if stanza not in ('Term', 'Typedef') or not tags:
+            return
+        owl = self.owl
+        owl.elements += 1
+        identifiers = [value for tag, value in tags if tag == 'id']
+        if not identifiers:
+            return
+        iri = self.iri(strip_trailing(identifiers[0]))
+        metadata = any(tag == 'is_metadata_tag' and value.startswith('true') for tag, value in tags)
+        if stanza == 'Term':
+            owl.add_class(iri)
+        elif metadata:
+            owl.add_annotation_property(iri)
+        else:
+            owl.add_object_property(iri)
+
+        for tag, value in tags:
+            if tag == 'name':
+                owl.add_annotation_property('rdfs:label')
+                owl.add_label(unescape(strip_trailing(value)), [iri])
+            elif tag == 'comment':
+                owl.add_annotation_property('rdfs:comment')
+                owl.add_comment(unescape(strip_trailing(value)), [iri])
+            elif tag == 'is_a' and stanza == 'Term':
+                owl.add_subclass(iri, self.iri(strip_trailing(value)))
+            elif tag == 'synonym':
+                match = QUOTED.match(value)
+                if match:
+                    owl.add_annotation_property(
+                        SYNONYM_SCOPES.get(match.group(2), SYNONYM_SCOPES['RELATED']))
+            elif tag in ANNOTATION_TAGS:
+                owl.add_annotation_property(ANNOTATION_TAGS[tag])
+
+
+def strip_trailing(value):
+    # drop trailing {modifiers} and ! comments
+    return TRAILING.sub('', value)
+
+
+def parse_obo(owl, chunks):
+    OboParser(owl).parse(chunks)
@@ -1,10 +1,100 @@
 # -*- encoding: utf-8 -*-
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import time
 from contextlib import closing
-
-import requests
+from itertools import chain
 
 from lxml import etree
 
+from ontparser import limits, mirror, parallel, releases
+from ontparser.graph import Graph
+from ontparser.limits import LimitExceeded
+from ontparser.obo import parse_obo
+from ontparser.rdf import parse_rdfxml
+from ontparser.tally import Tally
+from ontparser.turtle import parse_turtle
+
+
+OWL_NAMESPACE = 'http://www.w3.org/2002/07/owl#'
+
+
+def qualify(tag, namespace=OWL_NAMESPACE):
+    return '{%s}%s' % (namespace, tag)
+
+
+CLASS = qualify('Class')
+DATA_PROPERTY = qualify('DataProperty')
+OBJECT_PROPERTY = qualify('ObjectProperty')
+ANNOTATION_PROPERTY = qualify('AnnotationProperty')
+LITERAL = qualify('Literal')
+IRI = qualify('IRI')
+ABBREVIATED_IRI = qualify('AbbreviatedIRI')
+ONTOLOGY = qualify('Ontology')
+IMPORT = qualify('Import')
+
+
+CONVERTER_URL = 'http://owl.cs.manchester.ac.uk/converter/convert'
+
+# how much of a document may be read while sniffing its format
+FORMAT_DETECT_SIZE = 65536
+
+# chunk sizes for downloads and for (memory-mapped) local files; feeding
+# lxml's pull parser 16 KB to 1 MB at a time measured slower than 8 KB
+CONTENT_CHUNK_SIZE = 8192
+FILE_CHUNK_SIZE = 8192
+
+XML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+XML_ROOT = re.compile(r'<([A-Za-z_][\w.:-]*)')
+OBO_HEADER = re.compile(r'(format-version|data-version|ontology|date|saved-by|auto-generated-by|'
+                        r'subsetdef|synonymtypedef|default-namespace|idspace|import|remark)\s*:')
+OBO_STANZA = re.compile(r'^\[(Term|Typedef|Instance)\]', re.MULTILINE)
+TURTLE_DIRECTIVE = re.compile(r'(@prefix|@base|prefix\s|base\s)', re.IGNORECASE)
+TURTLE_SUBJECT = re.compile(r'(<[^<>\s"]*(://|#)[^<>\s"]*>|[\w-]*:[^\s(]*|_:\S+|\[)\s')
+OWL_SYNTAX = re.compile(r'(Prefix|Ontology|Import|Class|ObjectProperty|DataProperty|AnnotationProperty)\s*[(:]')
+
+
+def detect_format(head, url=''):
+    # Guess the serialization from the start of a document: 'owlxml',
+    # 'rdfxml', 'obo', 'turtle', 'unsupported' (functional or Manchester
+    # syntax, other XML), or None if more of the document is needed.
+    text = head.lstrip(u'\ufeff \t\r\n')
+    while text.startswith(u'#'):
+        text = text.partition(u'\n')[2].lstrip()
+    if TURTLE_DIRECTIVE.match(text):
+        return 'turtle'
+    if text.startswith(u'<') and not TURTLE_SUBJECT.match(text):
+        root = XML_ROOT.search(XML_COMMENT.sub(u'', text))
+        if root is None:
+            return None
+        local = root.group(1).rpartition(u':')[2]
+        if local == u'RDF':
+            return 'rdfxml'
+        if local == u'Ontology':
+            return 'owlxml'
+        return 'unsupported'
+    if OBO_HEADER.match(text) or OBO_STANZA.search(text):
+        return 'obo'
+    if OWL_SYNTAX.match(text):
+        return 'unsupported'
+    if TURTLE_SUBJECT.match(text):
+        return 'turtle'
+    path = url.partition('?')[0]
+    if path.endswith('.obo'):
+        return 'obo'
+    if path.endswith(('.ttl', '.n3')):
+        return 'turtle'
+    return None
+
+
+class NotModified(Exception):
+    # raised while opening the input when it still matches the validators
+    # passed to Owl, so a cached parse can be reused
+    pass
+
 
 class Node(object):
 
@@ -30,21 +120,21 @@ class Node(object):
 class Owl(object):
 
     def get_iri(self, e):
-        for irikey in ('IRI', 'abbreviatedIRI'):
-            if irikey in e.attrib:
-                iri = e.attrib[irikey]
-                return iri
-        raise RuntimeError('IRI not found for element %s' % e)
-
-    def declaration(self, elements, nodes):
-        for e in elements:
-            iri = self.get_iri(e)
-            nodes[iri] = Node(iri)
-        return
+        iri = e.get('IRI')
+        if iri is None:
+            iri = e.get('abbreviatedIRI')
+            if iri is None:
+                raise RuntimeError('IRI not found for element %s' % e)
+        return iri
+
+    @property
+    def nodes(self):
+        # {iri: node} view of the class hierarchy, for compatibility
+        return self.graph.nodes
 
     def find_node(self, iri):
-        if iri in self.nodes:
-            return self.nodes[iri]
+        if iri in self.graph.ids:
+            return self.graph.node(self.graph.ids[iri])
         if iri in self.data_properties:
             return self.data_properties[iri]
         if iri in self.object_properties:
@@ -53,163 +143,339 @@ class Owl(object):
             return self.annotations[iri]    
         return None
 
-    def __init__(self, url, already_converted=False):
+    # Events reported by the format front ends (OWL/XML below, RDF/XML,
+    # Turtle and OBO in their own modules)
+
+    def add_class(self, iri):
+        self.graph.add(iri)
+
+    def add_object_property(self, iri):
+        if iri not in self.object_properties:
+            self.object_properties[iri] = Node(iri)
+
+    def add_data_property(self, iri):
+        if iri not in self.data_properties:
+            self.data_properties[iri] = Node(iri)
+
+    def add_annotation_property(self, iri):
+        if iri not in self.annotations:
+            self.annotations[iri] = Node(iri)
+
+    def add_subclass(self, subclass_iri, superclass_iri):
+        self.graph.add_edge(subclass_iri, superclass_iri)
+
+    def check_text(self, text):
+        max_length = limits.MAX_TEXT_LENGTH
+        if max_length and text and len(text) > max_length:
+            raise LimitExceeded('Literal longer than {} characters'.format(max_length))
+
+    def add_label(self, label, iris):
+        self.check_text(label)
+        class_ids = self.graph.ids
+        for iri in iris:
+            if iri in class_ids:
+                self.tally.label(class_ids[iri], label)
+            else:
+                # not (yet) a class: applied once the document has been read
+                self._pending_labels[iri] = label
+
+    def add_comment(self, comment, iris):
+        self.check_text(comment)
+        self.tally.comment(comment)
+
+    def add_import(self, iri):
+        if iri and iri not in self.imports:
+            self.imports.append(iri)
+            if self.on_import is not None:
+                self.on_import(iri)
+
+    def handle_declaration(self, elem):
+        for child in elem:
+            tag = child.tag
+            if tag == CLASS:
+                self.add_class(self.get_iri(child))
+            elif tag == DATA_PROPERTY:
+                self.add_data_property(self.get_iri(child))
+            elif tag == OBJECT_PROPERTY:
+                self.add_object_property(self.get_iri(child))
+
+    def handle_subclass_of(self, elem):
+        classes = [child for child in elem if child.tag == CLASS]
+        if len(classes) == 2:
+            self.add_subclass(self.get_iri(classes[0]), self.get_iri(classes[1]))
+
+    def handle_annotation_assertion(self, elem):
+        is_label = False
+        is_comment = False
+        literals = []
+        iris = []
+        for child in elem:
+            tag = child.tag
+            if tag == ANNOTATION_PROPERTY:
+                iri = self.get_iri(child)
+                self.add_annotation_property(iri)
+                if iri == 'rdfs:label':
+                    is_label = True
+                elif iri == 'rdfs:comment':
+                    is_comment = True
+            elif tag == LITERAL:
+                literals.append(child)
+            elif tag == IRI or tag == ABBREVIATED_IRI:
+                iris.append(child.text)
+
+        if is_label:
+            if len(literals) == 0:
+                raise RuntimeError('Where is Literal for label %s?' % elem)
+            if len(literals) > 1:
+                raise RuntimeError('Why multiple Literals for label %s?' % elem)
+            self.add_label(literals[0].text, iris)
+        elif is_comment:
+            if len(literals) == 0:
+                raise RuntimeError('Where is Literal for  %s?' % elem)
+            if len(literals) > 1:
+                raise RuntimeError('Why multiple Literals for  %s?' % elem)
+            self.add_comment(literals[0].text, iris)
+
+    def handle_import(self, elem):
+        self.add_import((elem.text or '').strip())
+
+    # qualified tag -> handler, called with each element once it is complete
+    handlers = {
+        qualify('Declaration'): handle_declaration,
+        qualify('SubClassOf'): handle_subclass_of,
+        qualify('AnnotationAssertion'): handle_annotation_assertion,
+        IMPORT: handle_import,
+    }
+
+    def __init__(self, url, already_converted=False, validators=None, progress=None, domain_terms=(),
+                 keep_comments=False, previous=None, processes=0, wordnet=True, on_import=None):
         self.url = url
         self.already_converted = already_converted
-        self.parse()
+        self.validators = {}
+        # terms whose occurrences in comments are counted while parsing
+        self.domain_terms = domain_terms
+        # spool the comment text to a temporary file, for a snapshot
+        self.keep_comments = keep_comments
+        # optional callback, called as progress(phase, bytes_read, bytes_total)
+        self.progress = progress
+        # the parse of the previous release, to update WordNet counts and
+        # depths from instead of computing them for every class
+        self.previous = previous
+        # WordNet lookups are deferred to the end of the parse and spread
+        # over this many processes (see parallel.wordnet_lookup)
+        self.processes = processes
+        # without wordnet no label is looked up (and nltk is not imported);
+        # the WordNet counts stay zero
+        self.wordnet = wordnet
+        # optional callback, called with the IRI of each ontology the
+        # document imports as soon as the import is read
+        self.on_import = on_import
+        self.parse(validators)
+        # not kept with the parse (it is cached, and may be pickled)
+        self.progress = None
+        self.previous = None
+        self.on_import = None
 
 
-    def create_input_generator(self):
-        content_chunk_size = 8192
-        if self.url.startswith('http'):
-            if self.already_converted:
-                print 'Processing {}'.format(self.url)
-                req_url = self.url
-                kwargs = {'stream': True}
-            else:
+    def create_input_generator(self, validators=None, convert=False):
+        validators = validators or {}
+        if self.url.startswith('http') and mirror.mirror is not None and not convert:
+            # read the local copy, downloading or revalidating it first
+            print 'Processing {} (mirrored)'.format(self.url)
+            for chunk in self.read_file(mirror.mirror.fetch(self.url), validators):
+                yield chunk
+        elif self.url.startswith('http'):
+            if convert:
                 print 'Converting, then processing {}'.format(self.url)
-                req_url = 'http://owl.cs.manchester.ac.uk/converter/convert'
+                req_url = CONVERTER_URL
                 payload = {'ontology': self.url, 'format': 'OWL/XML'}
                 kwargs = {'stream': True, 'params': payload}
-            with closing(requests.get(req_url, **kwargs)) as response:
+            else:
+                print 'Processing {}'.format(self.url)
+                req_url = self.url
+                kwargs = {'stream': True}
+            # revalidate a cached parse with a conditional GET
+            headers = {}
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+            kwargs['headers'] = headers
+            with closing(mirror.session.get(req_url, **kwargs)) as response:
+                if response.status_code == 304:
+                    raise NotModified(self.url)
                 if response.status_code != 200:
                     raise RuntimeError(response.text.encode('utf-8'))
-                for chunk in response.iter_content(chunk_size=content_chunk_size, decode_unicode=True):
+                self.validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                if not convert and response.headers.get('Content-Length', '').isdigit():
+                    self.bytes_total = int(response.headers['Content-Length'])
+                # raw bytes: lxml and the text front ends decode them as
+                # they go
+                for chunk in response.iter_content(chunk_size=CONTENT_CHUNK_SIZE):
                     yield chunk
         else:
             self.local_file = True
-            with open(self.url) as fileobj:
-                while True:
-                    chunk = fileobj.read(content_chunk_size)
-                    if not chunk:
-                        break
-                    yield chunk
+            for chunk in self.read_file(self.url, validators):
+                yield chunk
+
+    def read_file(self, path, validators):
+        stat = os.stat(path)
+        self.validators = {'mtime': stat.st_mtime, 'size': stat.st_size}
+        if validators == self.validators:
+            raise NotModified(self.url)
+        self.bytes_total = stat.st_size
+        if not stat.st_size:
+            return
+        with open(path, 'rb') as fileobj:
+            with closing(mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)) as mapped:
+                for offset in xrange(0, stat.st_size, FILE_CHUNK_SIZE):
+                    yield mapped[offset:offset + FILE_CHUNK_SIZE]
+
+    def sniff_format(self, chunks):
+        # read just enough of the input to recognize its format; returns the
+        # format and the chunks consumed so far
+        head = []
+        size = 0
+        fmt = None
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            text = u''.join(c if isinstance(c, unicode) else c.decode('utf-8', 'replace')
+                            for c in head)
+            fmt = detect_format(text, self.url)
+            if fmt is not None or size >= FORMAT_DETECT_SIZE:
+                break
+        return fmt, head
+
+    def read_input(self, chunks):
+        # Also times how long the parse waits for input (download or disk),
+        # and enforces the document size and element limits (before every
+        # chunk, so after the front end has handled the previous one).
+        progress = self.progress
+        max_bytes = limits.MAX_DOCUMENT_BYTES
+        max_elements = limits.MAX_ELEMENTS
+        chunks = iter(chunks)
+        while True:
+            if max_elements and self.elements > max_elements:
+                raise LimitExceeded('Document with more than {} elements'.format(max_elements))
+            started = time.time()
+            chunk = next(chunks, None)
+            self.read_seconds += time.time() - started
+            if chunk is None:
+                return
+            self.bytes_read += len(chunk)
+            if max_bytes and max(self.bytes_read, self.bytes_total) > max_bytes:
+                raise LimitExceeded('Document larger than {} bytes'.format(max_bytes))
+            if progress is not None:
+                progress('parse', self.bytes_read, self.bytes_total)
+            if isinstance(chunk, unicode):
+                self._content_hash.update(chunk.encode('utf-8'))
+            else:
+                self._content_hash.update(chunk)
+            yield chunk
+
+    def parse_owlxml(self, chunks):
+        # Only the axioms handled above (and the root) are reported by the
+        # pull parser; every other element is skipped inside lxml. After
+        # each chunk, every complete element is dropped from the tree, at
+        # any depth, except inside an axiom that is still open, so the tree
+        # holds little more than one chunk whatever the document's layout.
+        handlers = self.handlers
+        parser = etree.XMLPullParser(('start', 'end'), tag=list(handlers) + [ONTOLOGY])
+        root = None
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        # the Ontology element, or whatever wraps the axioms
+                        root = elem.getroottree().getroot()
+                elif elem.tag in handlers:
+                    self.elements += 1
+                    handlers[elem.tag](self, elem)
+            # the last child of each element is the only one that may still
+            # be open
+            node = root
+            while node is not None and len(node) and node.tag not in handlers:
+                del node[:-1]
+                node = node[-1]
 
-    def parse(self):
-        nsmap = {}
-        nsmap_alt = {}
-        event_types = ('start', 'end', 'start-ns')
-        parser = etree.XMLPullParser(event_types)
+    # format -> front end, called with the Owl and its input chunks
+    parsers = {
+        'owlxml': parse_owlxml,
+        'rdfxml': parse_rdfxml,
+        'obo': parse_obo,
+        'turtle': parse_turtle,
+    }
 
-        self.nodes = {}
+    def parse(self, validators=None):
+        self.graph = Graph()
         self.data_properties = {}
         self.object_properties = {}
         self.annotations = {}
-        self._subclasses = []
-        self._labels = []
-        self._comments = []
-        self.average_comment_length = 0
-        self.average_annotation_length = 0
-        self.total_comment_length = 0
-        self.total_annotation_length = 0
-
-        xml_depth = 0
-        bytes_read = 0
-        for i, chunk in enumerate(self.create_input_generator()):
-            bytes_read += len(chunk)
-            #if i % 100 == 0:
-                #print bytes_read
-            parser.feed(chunk)
+        self.tally = Tally(self.graph, self.domain_terms,
+                           tempfile.TemporaryFile() if self.keep_comments else None,
+                           wordnet=(self.wordnet and self.previous is None and
+                                    not parallel.enabled(self.processes)))
+        # (content hash of the previous release, change counts) if parsed
+        # against one
+        self.changes = None
+        self._pending_labels = {}
+        # IRIs of the ontologies imported, in document order
+        self.imports = []
+        self.bytes_read = 0
+        self.bytes_total = None
+        self.read_seconds = 0.0
+        # axioms, triples or stanzas handled by the format front end
+        self.elements = 0
+        self._content_hash = hashlib.md5()
 
-            for event, elem in parser.read_events():
-                if event == 'start-ns': # start of a namespace declaration
-                    ns, url = elem
-                    nsmap[ns] = url
-                    if ns == '':
-                        nsmap_alt['owl'] = url
-                    else:
-                        nsmap_alt[ns] = url
-                elif event == 'start':
-                    xml_depth += 1
-                elif event == 'end':
-                    if elem.tag == fixtag('', 'Declaration', nsmap):
-                        self.declaration(elem.findall('owl:Class', nsmap_alt),
-                                         self.nodes)
-                        self.declaration(elem.findall('owl:DataProperty', nsmap_alt),
-                                         self.data_properties)
-                        self.declaration(elem.findall('owl:ObjectProperty', nsmap_alt),
-                                         self.object_properties)
-
-                    elif elem.tag == fixtag('', 'SubClassOf', nsmap):
-                        classes = elem.findall('owl:Class', nsmap_alt)
-                        if len(classes) == 2:
-                            subclass_iri = self.get_iri(classes[0])
-                            superclass_iri = self.get_iri(classes[1])
-                            self._subclasses.append([subclass_iri, superclass_iri])
-
-                    elif elem.tag == fixtag('', 'AnnotationAssertion', nsmap):
-                        # is it a label?
-                        properties = elem.findall('owl:AnnotationProperty', nsmap_alt)
-                        self.declaration(properties, self.annotations)
-                        is_label = False
-                        is_comment = False
-                        num_comments = 0
-                        for p in properties:
-                            iri = self.get_iri(p)
-                            if iri == 'rdfs:label':
-                                is_label = True
-                            elif iri == 'rdfs:comment':
-                                is_comment = True
-
-
-                        if is_label:
-                            # get the label
-                            literals = elem.findall(fixtag('', 'Literal', nsmap))
-                            if len(literals) == 0:
-                                raise RuntimeError('Where is Literal for label %s?' % elem)
-                            if len(literals) > 1:
-                                raise RuntimeError('Why multiple Literals for label %s?' % elem)
-                            label = literals[0].text
-                            #print(label)
-
-                            # get IRIs that label will be applied to
-                            iris = elem.findall('owl:IRI', nsmap_alt)
-                            airis = elem.findall('owl:AbbreviatedIRI', nsmap_alt)
-                            self._labels.append([label, [i.text for i in iris + airis]])
-                        elif is_comment:
-                            # get the literal
-                            literals = elem.findall(fixtag('', 'Literal', nsmap))
-                            if len(literals) == 0:
-                                raise RuntimeError('Where is Literal for  %s?' % elem)
-                            if len(literals) > 1:
-                                raise RuntimeError('Why multiple Literals for  %s?' % elem)
-                            comment = literals[0].text    
-                            # get IRIs that comment will be applied to
-                            iris = elem.findall('owl:IRI', nsmap_alt)
-                            airis = elem.findall('owl:AbbreviatedIRI', nsmap_alt)
-                            self._comments.append([comment, [i.text for i in iris + airis]])
-                            self.total_comment_length += len(self._comments[0])
-                            self.total_annotation_length += len(self.annotations)
-
-                    if xml_depth == 2:
-                        # clean up children
-                        elem.clear()
-                        # clean up preceding siblings
-                        while elem.getprevious() is not None:
-                            del elem.getparent()[0]
-                    xml_depth -= 1
-
-        if not self.nodes:
+        chunks = self.create_input_generator(validators)
+        if self.already_converted:
+            self.format, head = 'owlxml', []
+        else:
+            self.format, head = self.sniff_format(chunks)
+        if self.format not in self.parsers:
+            chunks.close()
+            if not self.url.startswith('http'):
+                raise RuntimeError('Unrecognized ontology format: %s' % self.url)
+            # not something we parse natively (e.g. functional or Manchester
+            # syntax): fall back to the remote converter
+            self.bytes_total = None
+            chunks = self.create_input_generator(convert=True)
+            self.format, head = 'owlxml', []
+        self.parsers[self.format](self, self.read_input(chain(head, chunks)))
+
+        if not len(self.graph):
             raise RuntimeError('No nodes found in document')
+        self.content_hash = self._content_hash.hexdigest()
+        del self._content_hash
+
+        # Build the parent/child adjacency arrays
+        self.graph.freeze()
 
-        # Apply superclasses and subclasses
-        for subclass_iri, superclass_iri in self._subclasses:
-            if superclass_iri not in self.nodes:
-                self.nodes[superclass_iri] = Node(superclass_iri)
-            if subclass_iri not in self.nodes:
-                self.nodes[subclass_iri] = Node(subclass_iri)
-            self.nodes[superclass_iri].children.append(subclass_iri)
-            self.nodes[subclass_iri].parents.append(superclass_iri)
-
-        # Apply labels
-        for label, iris in self._labels:
-            for iri in iris:
+        # Apply the labels seen before their entity was known to be a class,
+        # unless the class was labelled again later on
+        class_ids = self.graph.ids
+        class_labels = self.graph.labels
+        for iri, label in self._pending_labels.iteritems():
+            if iri in class_ids:
+                if class_labels[class_ids[iri]] is None:
+                    self.tally.label(class_ids[iri], label)
+            else:
                 node = self.find_node(iri)
                 if node:
                     node.label = label
+        del self._pending_labels
 
-        print('comments: ' + str(len(self._comments)))
-        print('annotations: ' + str(len(self.annotations)))
-        
-def fixtag(ns, tag, nsmap):
-    return '{' + nsmap[ns] + '}' + tag
+        if not self.wordnet:
+            pass
+        elif self.previous is not None:
+            self.changes = (self.previous.content_hash, releases.update(self.previous, self))
+        elif not self.tally.wordnet:
+            started = time.time()
+            self.tally.count_labels(parallel.wordnet_lookup(self.graph.labels, self.processes))
+            self.tally.wordnet_seconds += time.time() - started
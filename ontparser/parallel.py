@@ -0,0 +1,127 @@
+# -*- encoding: utf-8 -*-
+import multiprocessing
+import os
+import threading
+
+from ontparser import cache, instrument, lexicon, mirror
+from ontparser.textindex import TextIndex
+
+# Processes used to score one ontology (owl_quality's default); 0 or 1
+# scores it in the calling process.
+PROCESSES = int(os.environ.get('OWLPARSER_SCORING_PROCESSES', 0))
+
+# below these sizes starting a pool costs more than it saves
+MIN_LABELS = 2000
+MIN_TEXTS = 50000
+
+# work is cut into this many slices per process, so that a slow slice
+# does not leave the other processes idle
+SLICES_PER_PROCESS = 4
+
+# What the pool works on, in a pool process. Each pool sets it in its own
+# processes (share), which inherit it through the fork (copy-on-write)
+# instead of being sent a pickled copy.
+_shared = None
+
+# Several threads (job workers, import resolvers, requests) may start pools
+# at once; they fork one at a time (start_pool).
+_fork_lock = threading.Lock()
+
+
+def enabled(processes):
+    # pool processes are daemonic and may not start pools of their own
+    return processes > 1 and not multiprocessing.current_process().daemon
+
+
+def slices(count, processes):
+    size = max(1, -(-count // (processes * SLICES_PER_PROCESS)))
+    return [(start, min(start + size, count)) for start in xrange(0, count, size)]
+
+
+def after_fork(initializer=None, *initargs):
+    # Pool process initializer. Other threads of the parent may have held
+    # the process-wide locks at the fork, and its HTTP connections and
+    # WordNet files are shared with it, so all of those are replaced before
+    # initializer(*initargs) runs.
+    lexicon.wordnet.after_fork()
+    cache.graphs.after_fork()
+    cache.results.after_fork()
+    instrument.metrics.after_fork()
+    mirror.after_fork()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def start_pool(processes, initializer=None, initargs=()):
+    # a multiprocessing.Pool, forked while no other pool is
+    with _fork_lock:
+        return multiprocessing.Pool(processes, after_fork, (initializer,) + tuple(initargs))
+
+
+def share(shared):
+    global _shared
+    _shared = shared
+
+
+def run(function, tasks, processes, shared):
+    # function(task) for every task on a pool that shares shared; results
+    # are returned in task order
+    pool = start_pool(processes, share, (shared,))
+    try:
+        results = pool.map(function, tasks)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
+
+
+def resolve_keys(bounds):
+    start, end = bounds
+    entries = []
+    for key in _shared[start:end]:
+        entry = lexicon.wordnet.resolve(key)
+        entries.append((key, entry.count, entry.names))
+    return entries
+
+
+def wordnet_lookup(labels, processes):
+    # Returns a function mapping each of labels to its WordNetEntry, like
+    # lexicon.wordnet.lookup. Labels that are not cached yet are looked up
+    # across processes if there are enough of them; the results are added
+    # to the cache.
+    lookup = lexicon.wordnet
+    if not enabled(processes):
+        return lookup.lookup
+    keys = set(label.lower() for label in labels if label)
+    missing = [key for key in keys if key not in lookup.cache]
+    if len(missing) < MIN_LABELS:
+        return lookup.lookup
+    # load WordNet once, here, rather than in every process
+    lookup.preload()
+    resolved = {}
+    for entries in run(resolve_keys, slices(len(missing), processes), processes, missing):
+        for key, count, names in entries:
+            entry = lexicon.WordNetEntry(count, names) if count else lexicon.EMPTY_ENTRY
+            resolved[key] = entry
+            lookup.cache.put(key, entry)
+
+    def entry(label):
+        if label and label.lower() in resolved:
+            return resolved[label.lower()]
+        return lookup.lookup(label)
+    return entry
+
+
+def count_slice(task):
+    start, end, terms = task
+    return TextIndex(_shared[start:end]).count_all(terms)
+
+
+def count_terms(texts, terms, processes):
+    # what TextIndex(texts).count_all(terms) returns; each text is in
+    # exactly one slice, so the slices' counts add up to it
+    if not enabled(processes) or len(texts) < MIN_TEXTS:
+        return TextIndex(texts).count_all(terms)
+    tasks = [(start, end, terms) for start, end in slices(len(texts), processes)]
+    return sum(run(count_slice, tasks, processes, texts))
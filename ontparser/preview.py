@@ -0,0 +1,169 @@
+# -*- encoding: utf-8 -*-
+import math
+import os
+from collections import Counter
+
+import numpy as np
+
+from ontparser import lexicon
+
+# Preview scoring (owl_quality's mode='preview'). The metrics that take a
+# WordNet lookup per class label (interpretability, precision, clarity,
+# comprehensiveness) or a domain search per entity (relevance) are
+# estimated from a random sample of the classes and of the entities. The
+# sample grows in batches until the 95% confidence interval of every
+# estimated result metric is within the target error, or until it is the
+# whole ontology (the estimates are then the full scores). A seed draws the
+# same sample of the same ontology every time.
+
+# half-width the confidence intervals are sampled down to
+ERROR = float(os.environ.get('OWLPARSER_PREVIEW_ERROR', 0.02))
+SEED = int(os.environ.get('OWLPARSER_PREVIEW_SEED', 0))
+
+CONFIDENCE = 0.95
+Z = 1.96
+
+# the first batch, and the smallest sample that may stop (with fewer the
+# normal approximation behind the intervals does not hold)
+MIN_SAMPLE = 400
+# each further batch grows the sample by this factor
+GROWTH = 1.5
+
+
+class Sampler(object):
+    # Draws items 0..population-1 without replacement in a random order
+    # fixed by seed, a batch at a time.
+
+    def __init__(self, population, seed):
+        self.population = population
+        self.order = np.random.RandomState(seed).permutation(population)
+        self.size = 0
+
+    def batches(self):
+        while self.size < self.population:
+            stop = min(self.population, max(MIN_SAMPLE, int(self.size * GROWTH)))
+            batch = self.order[self.size:stop]
+            self.size = stop
+            yield batch.tolist()
+
+    def correction(self):
+        # finite population correction: none of the variance is left once
+        # every item is sampled
+        return 1.0 - float(self.size) / self.population if self.population else 0.0
+
+
+class Estimate(object):
+
+    def __init__(self, value, half_width, low=None, high=None):
+        self.value = value
+        self.half_width = half_width
+        self.low = value - half_width if low is None else low
+        self.high = value + half_width if high is None else high
+
+    def scaled(self, factor, offset=0.0):
+        # the estimate of factor * x + offset
+        return Estimate(self.value * factor + offset, self.half_width * factor,
+                        self.low * factor + offset, self.high * factor + offset)
+
+    def interval(self, upper=None):
+        # [low, high], within the range of the metric
+        high = self.high if upper is None else min(self.high, upper)
+        return [round(max(self.low, 0.0), 3), round(high, 3)]
+
+
+def mean_estimate(values, sampler):
+    # mean of the population from the sample values
+    n = len(values)
+    values = np.asarray(values, float)
+    mean = float(values.mean()) if n else 0.0
+    correction = sampler.correction()
+    if not correction:
+        return Estimate(mean, 0.0)
+    variance = float(values.var(ddof=1)) if n > 1 else float('inf')
+    # a sample with no (or only equal) values still leaves an interval,
+    # about the "rule of three" bound for an event never seen in n tries
+    half_width = max(Z * math.sqrt(variance / n * correction), 3.0 / n * correction)
+    return Estimate(mean, half_width)
+
+
+def ratio_estimate(numerators, denominators, sampler):
+    # sum(numerators) / sum(denominators) of the population, or None if
+    # the sampled denominators are all 0
+    numerators = np.asarray(numerators, float)
+    denominators = np.asarray(denominators, float)
+    total = denominators.sum()
+    if not total:
+        return None
+    ratio = float(numerators.sum() / total)
+    correction = sampler.correction()
+    if not correction:
+        return Estimate(ratio, 0.0)
+    n = len(numerators)
+    residuals = numerators - ratio * denominators
+    half_width = Z * math.sqrt(float(residuals.var(ddof=1)) / n * correction) / (total / n)
+    return Estimate(ratio, max(half_width, 3.0 / n * correction))
+
+
+def distinct_estimate(names, sampler):
+    # Number of distinct synonyms over all the classes from the classes
+    # sampled. The sample misses synonyms named by few classes, so this is
+    # the guaranteed-error estimator (GEE) of Charikar et al.: each synonym
+    # named by one sampled class stands for sqrt(N / n) synonyms. Its
+    # bounds are the ratio error it is guaranteed to stay within, and at
+    # least the synonyms seen; they are not a confidence interval.
+    seen = len(names)
+    if sampler.size >= sampler.population:
+        return Estimate(float(seen), 0.0)
+    scale = math.sqrt(float(sampler.population) / sampler.size)
+    singletons = sum(1 for count in names.itervalues() if count == 1)
+    value = scale * singletons + (seen - singletons)
+    return Estimate(value, 0.0, max(float(seen), value / scale), value * scale)
+
+
+class LabelSample(object):
+    # WordNet counts of a sample of the class labels, drawn until the
+    # interpretability and precision intervals are within error.
+
+    def __init__(self, graph, error=ERROR, seed=SEED):
+        labels = graph.labels
+        sampler = self.sampler = Sampler(len(labels), seed)
+        defined = []
+        definitions = []
+        self.synonyms = Counter()
+        lookup = lexicon.wordnet.lookup
+        for batch in sampler.batches():
+            for node_id in batch:
+                entry = lookup(labels[node_id])
+                defined.append(1 if entry.count else 0)
+                definitions.append(entry.count)
+                self.synonyms.update(entry.names)
+            self.defined = mean_estimate(defined, sampler)
+            self.definitions = mean_estimate(definitions, sampler)
+            self.precision = ratio_estimate(defined, definitions, sampler)
+            if self.defined.half_width <= error and (
+                    self.precision is None or self.precision.half_width <= error):
+                break
+        if not len(labels):
+            self.defined = self.definitions = Estimate(0.0, 0.0)
+            self.precision = None
+        self.num_synonyms = distinct_estimate(self.synonyms, sampler)
+
+
+class TextSample(object):
+    # Domain matches of a sample of the entity texts (one per domain term a
+    # text contains, as TextIndex.count_all counts them), drawn until the
+    # interval of the matches per entity is within error.
+
+    def __init__(self, texts, terms, error=ERROR, seed=SEED):
+        terms = [term.lower() for term in terms]
+        sampler = self.sampler = Sampler(len(texts), seed)
+        matches = []
+        for batch in sampler.batches():
+            for index in batch:
+                text = (texts[index] or u'').lower()
+                matches.append(sum(1 for term in terms if term in text))
+            self.matches = mean_estimate(matches, sampler)
+            if self.matches.half_width <= error:
+                break
+        if not len(texts):
+            self.matches = Estimate(0.0, 0.0)
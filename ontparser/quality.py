@@ -1,46 +1,21 @@
 # -*- encoding: utf-8 -*-
+import copy
+import cProfile
+import logging
 import os
 
-from ontparser.owlparser import Owl
+from ontparser import (analytics, cache, export, imports, lexicon, parallel, preview, releases,
+                       scoreindex, snapshot)
+from ontparser.hierarchy import compute_depths
+from ontparser.instrument import Profile, dump_trace
+from ontparser.owlparser import NotModified, Owl
+from ontparser.textindex import TextIndex
 
-# we put the nltk data in a non-standard location, which requires that
-# we set an environment variable indicating where the data will be
-# found:
-script_dir = os.path.dirname(os.path.realpath(__file__))
-os.environ['NLTK_DATA'] = os.path.join(script_dir, '..', 'nltk_data')
-from nltk.corpus import wordnet as wn  # noqa: E402
+log = logging.getLogger(__name__)
 
 
-def set_wn_synonym_count(node):
-    if node.label:
-        node.wn_count = len(wn.synsets(node.label))
-    else:
-        node.wn_count = 0
-
-def set_synset_list(node):
-    synonym_list = []
-    #if (node.label):
-        #print("Label" + node.label)
-        #print(len(wn.synsets(node.label)))
-    #else:
-        #print("none")
-    #print(len(wn.synsets("be")))
-    if node.label:
-        for synset in wn.synsets(node.label):
-            fullname = synset.name()
-            fulltuple = fullname.partition('.')
-            synonym_list.append(fulltuple[0])
-    #print ("number of synonyms: " + str(len(synonym_list)))
-    return synonym_list
-
 def get_synonyms(word):
-    synonym_list = []
-    for synset in wn.synsets(word):
-        fullname = synset.name()
-        fulltuple = fullname.partition('.')
-        if not fulltuple[0] in synonym_list:
-            synonym_list.append(fulltuple[0])
-    return synonym_list
+    return list(lexicon.wordnet.lookup(word).names)
 
 def split_words(domain):
     return filter(lambda z: len(z), [x.strip() for x in domain.split(',')])
@@ -53,64 +28,76 @@ def set_domain_synset_list(domain):
 
 class OwlQuality(object):
 
-    def __init__(self, nodes, object_properties, data_properties, annotations, average_annotation_length,
-            comments,average_comment_length, semiotic_quality_flags=None, domain=None):
-        self.nodes = nodes
-        self.object_properties = object_properties
-        self.data_properties = data_properties
-        self.annotations = annotations
-        self.comments = comments
+    def __init__(self, owl, semiotic_quality_flags=None, domain=None, progress=None, profile=None,
+                 processes=0, wordnet=True, sample=None):
+        self.nodes = owl.nodes
+        self.graph = owl.graph
+        self.object_properties = owl.object_properties
+        self.data_properties = owl.data_properties
+        self.annotations = owl.annotations
+        # comment and WordNet counts, accumulated while parsing
+        self.tally = owl.tally
         self.domain = domain
-        self.complete_synonym_list = []
         self.domain_matches = 0
+        # False if the labels were not looked up in WordNet
+        self.wordnet = wordnet
+        # (target error, seed) to estimate the WordNet and domain counts
+        # from samples (see preview), or None to count them in full
+        self.sample = sample
+        self.label_sample = self.text_sample = None
+        self.comment_matches = 0
         if semiotic_quality_flags is None:
             self.semiotic_quality_flags = set()
         else:
             self.semiotic_quality_flags = semiotic_quality_flags
-
-        self.leaf_nodes = {
-            k: v for k, v in self.nodes.iteritems() if len(v.children) == 0
-        }
-
-        # calculate max_depth for all leaf nodes
-        for node in self.leaf_nodes.itervalues():
-            node.max_depth = self.get_max_depth(node)
-
-        self.root_nodes = {
-            k: v for k, v in self.nodes.iteritems() if v.root_node
-        }
-
-        # for leaf nodes, find average depth and deepest one
-        num_leaf_nodes = len(self.leaf_nodes)
-        if num_leaf_nodes:
-            self.deepest_leaf_node = max(
-                v.max_depth for v in self.leaf_nodes.itervalues())
-            self.avg_leaf_node_depth = float(
-                sum(v.max_depth for v in self.leaf_nodes.itervalues())) / num_leaf_nodes
+        if progress is None:
+            progress = lambda phase: None
+        if profile is None:
+            profile = Profile()
+
+        # calculate max_depth, root and leaf flags for all nodes in one pass
+        graph = self.graph
+        progress('depth')
+        with profile.phase('depth'):
+            # depths only depend on the parse, so cached and snapshot
+            # parses keep them
+            if graph.depths is None:
+                graph.depths = compute_depths(graph)
+            depths = graph.depths
+        self.leaf_nodes = depths.leaf_nodes
+        self.root_nodes = depths.root_nodes
+        self.cycle_nodes = depths.cycle_nodes
+        if self.cycle_nodes:
+            log.warning('%s: subclass cycles broken at: %s', owl.url,
+                        ', '.join(graph.iris[node_id] for node_id in self.cycle_nodes))
+
+        # depth, breadth and fan-out statistics, and for leaf nodes the
+        # average depth and deepest one
+        with profile.phase('structure'):
+            self.structure_stats = analytics.Structure(graph)
+        self.deepest_leaf_node = self.structure_stats.deepest_leaf
+        self.avg_leaf_node_depth = self.structure_stats.avg_leaf_depth()
+
+        # number of synonyms for each label and the unique set of synonyms
+        # were counted as the labels were parsed
+        progress('semantic')
+        tally = self.tally
+        if sample is not None and wordnet:
+            # the parse skipped WordNet; look up a sample of the labels
+            with profile.phase('sample'):
+                self.label_sample = preview.LabelSample(graph, *sample)
+            self.count_definitions = self.label_sample.definitions.value * len(graph)
+            self.count_defined = self.label_sample.defined.value * len(graph)
+            self.num_synonyms = int(round(self.label_sample.num_synonyms.value))
         else:
-            self.deepest_leaf_node = 0
-            self.avg_leaf_node_depth = 0
-
-        # get number of synonyms for each one and create unique set of synonyms
-        self.count_definitions = 0
-        self.count_defined = 0
-        for node in self.nodes.itervalues():
-            #print(node)
-            set_wn_synonym_count(node)  # count number of synonyms
-            temp_synonym_list = set_synset_list(node) # create synonym list
-            for item in temp_synonym_list:
-                if item not in self.complete_synonym_list:
-                    self.complete_synonym_list.append(item)   # create unique list
-                    #print('adding ' + str(item))
-            if node.wn_count > 0:
-                self.count_defined += 1
-            self.count_definitions += node.wn_count
-
-        total_comment_length = 0
-        for comment in self.comments:
-            total_comment_length += len(comment)
-        if len(self.comments) > 0:
-            self.average_comment_length = total_comment_length/len(self.comments)
+            self.count_definitions = tally.count_definitions
+            self.count_defined = tally.count_defined
+            self.num_synonyms = len(tally.synonyms)
+
+        progress('pragmatic')
+        self.num_comments = tally.comment_count
+        if self.num_comments > 0:
+            self.average_comment_length = tally.comment_length/self.num_comments
         else:
             self.average_comment_length = 0
 
@@ -125,21 +112,32 @@ class OwlQuality(object):
         # get number of nodes that match the domain or a synonym of the domain
 
         if domain:
-          for item in set_domain_synset_list(domain):
-             self.domain_matches += sum(1 for node in self.nodes.itervalues()
-                                       if unicode(item).lower() in unicode(node).lower())
-             self.domain_matches += sum(1 for node in self.object_properties.itervalues()
-                                       if item.lower() in unicode(node).lower())
-             self.domain_matches += sum(1 for node in self.data_properties.itervalues()
-                                        if item.lower() in unicode(node).lower())
-             self.domain_matches += sum(1 for node in self.annotations.itervalues()
-                                        if item.lower() in unicode(node).lower())
-             self.domain_matches += sum(1 for node in self.comments
-                                        if item.lower() in unicode(node).lower())
+            with profile.phase('domain'):
+                terms = set_domain_synset_list(domain)
+                self.comment_matches = tally.comment_hits(terms)
+                if sample is not None:
+                    texts = self.texts()
+                    self.text_sample = preview.TextSample(texts, terms, *sample)
+                    entity_matches = self.text_sample.matches.value * len(texts)
+                else:
+                    entity_matches = parallel.count_terms(self.texts(), terms, processes)
+                self.domain_matches = entity_matches + self.comment_matches
         else:
             self.domain_matches = 0
 
-        self.semiotic_metric_value_computation()
+        with profile.phase('metrics'):
+            self.semiotic_metric_value_computation()
+
+    def texts(self):
+        # text of every class, property and annotation property, searched
+        # once per domain synonym (comments were searched while parsing)
+        texts = [self.graph.text(node_id) for node_id in xrange(len(self.graph))]
+        for entities in (self.object_properties, self.data_properties, self.annotations):
+            texts.extend(unicode(node) for node in entities.itervalues())
+        return texts
+
+    def text_index(self):
+        return TextIndex(self.texts())
 
     def semiotic_metric_value_computation(self):
 
@@ -205,9 +203,9 @@ class OwlQuality(object):
 
         self.adaptability = round((self.cohesion1 + self.cohesion2) /2.0, 3)
         #self.comprehensiveness = round(num_classes/113307.0, 3); # 113307 is the max number of classes in the testing set so this value is normalized
-        self.comprehensiveness = round(len(self.complete_synonym_list)/(len(self.nodes)+num_attributes),3) # new definition - comprehensiveness = number of synonyms represented/(nodes+attributes)
+        self.comprehensiveness = self.comprehensiveness_of(self.num_synonyms)
 
-        self.ease_of_use =  round(float(len(self.comments))/(num_classes+num_attributes+num_annotations),3)
+        self.ease_of_use =  round(float(self.num_comments)/(num_classes+num_attributes+num_annotations),3)
         #self.ease_of_use = self.average_comment_length + self.average_annotation_length
         if self.ease_of_use > 1.0:
             self.ease_of_use = 1.0
@@ -223,6 +221,11 @@ class OwlQuality(object):
 
         self.overall_social = 0.0   # fix this later
 
+        if not self.wordnet:
+            # unknown rather than 0 (the semantic layer is not in overall)
+            self.clarity = self.interp = self.precision = self.overall_semantic = None
+            self.comprehensiveness = None
+
         # compute overall_quality
         if len(self.semiotic_quality_flags):
             filtered_quality_flags = [getattr(self, 'overall_%s' % sqf)
@@ -231,68 +234,327 @@ class OwlQuality(object):
         else:
             self.overall = 0.0
 
-    def get_max_depth(self, node_value, depth=0):
-        if len(node_value.parents) == 0:
-            node_value.root_node = True
-            return depth
-        max_depth = depth
-        for pname in node_value.parents:
-            p_depth = depth + 1
-            p_depth = self.get_max_depth(self.nodes[pname], p_depth)
-            max_depth = max(max_depth, p_depth)
-        return max_depth
-
-    def print_node_tree(self, node, level=0):
-        print '  ' * level + ('%s (%d)' % (node, node.wn_count))
-        for child_name in node.children:
-            child_node = self.nodes[child_name]
-            self.print_node_tree(child_node, level + 1)
-
-    def print_tree(self, level=0):
-        for node in self.root_nodes.itervalues():
-            # do not print stand-alone trees
-            if node.children:
+    def comprehensiveness_of(self, num_synonyms):
+        # new definition - comprehensiveness = number of synonyms represented/(nodes+attributes)
+        num_attributes = len(self.object_properties) + len(self.data_properties)
+        return round(int(num_synonyms)/(len(self.nodes)+num_attributes),3)
+
+    def preview_report(self):
+        # how much of the ontology a preview sampled, and the intervals of
+        # the metrics it estimated
+        num_classes = len(self.nodes)
+        num_entities = (num_classes + len(self.object_properties) + len(self.data_properties) +
+                        len(self.annotations))
+        sampled = {}
+        intervals = {}
+        if self.label_sample is not None:
+            labels = self.label_sample
+            sampled['classes'] = {'sampled': labels.sampler.size, 'total': num_classes}
+            intervals['semantic.interpretability'] = labels.defined.interval(1.0)
+            intervals['semantic.precision'] = (labels.precision.interval(1.0)
+                                               if labels.precision is not None else [0.0, 1.0])
+            intervals['semantic.clarity'] = labels.definitions.interval()
+            intervals['pragmatic.comprehensiveness'] = [
+                self.comprehensiveness_of(labels.num_synonyms.low),
+                self.comprehensiveness_of(labels.num_synonyms.high)]
+        if self.text_sample is not None:
+            texts = self.text_sample
+            sampled['entities'] = {'sampled': texts.sampler.size, 'total': num_entities}
+            intervals['pragmatic.relevance'] = texts.matches.scaled(
+                1.0, float(self.comment_matches) / num_entities).interval()
+        return {
+            'target_error': self.sample[0],
+            'seed': self.sample[1],
+            'confidence': preview.CONFIDENCE,
+            'sample': sampled,
+            'intervals': intervals,
+        }
+
+    def print_tree(self):
+        # shared subtrees are printed once, and marked ^ where they recur
+        for record in export.tree(self.graph):
+            if not record['depth']:
+                # do not print stand-alone trees
+                if not record['children']:
+                    continue
                 print '------'
                 print ' Tree'
                 print '------'
-                self.print_node_tree(node)
+            text = record['iri'] if record['label'] is None else record['label']
+            if record.get('ref'):
+                line = u'%s ^' % text
+            else:
+                line = u'%s (%d)' % (text, record['wn_count'])
+            print (u'  ' * record['depth'] + line).encode('utf-8')
 
     def print_labeled(self):
         print '-----------------------'
         print ' Labeled Nodes (by IRI)'
         print '-----------------------'
         # sort by iri, not label
-        for node in sorted([n for n in self.nodes.itervalues() if n.label],
-                           key=lambda node: node.iri):
-            print '%s %s' % (node.iri, node)
+        for record in export.labeled(self.graph):
+            print (u'%s %s' % (record['iri'], record['label'])).encode('utf-8')
 
     def print_unlabeled(self):
         print '-----------------'
         print ' Unlabeled Nodes'
         print '-----------------'
-        # sort by iri, not label
-        for node in sorted([n for n in self.nodes.itervalues() if not n.label],
-                           key=lambda node: node.iri):
-            print node.iri
-
-
-def owl_quality(url, semiotic_quality_flags, domain, debug=False, already_converted=False):
-    owl = Owl(url, already_converted)
-    quality = OwlQuality(owl.nodes, owl.object_properties, owl.data_properties, owl.annotations,
-                         owl.average_annotation_length, owl._comments,owl.average_comment_length,
-                         semiotic_quality_flags, domain)
-    if debug:
-        quality.print_tree()
-        quality.print_labeled()
-        quality.print_unlabeled()
-
-    return {
+        for record in export.unlabeled(self.graph):
+            print record['iri'].encode('utf-8')
+
+
+# most domain terms a cached parse keeps counting in comments
+MAX_DOMAIN_TERMS = 256
+
+
+def load_owl(url, already_converted=False, use_cache=True, progress=None, profile=None,
+             domain_terms=(), previous=None, processes=0, wordnet=True, on_import=None):
+    # parse the ontology, or reuse the cached parse if the source still
+    # validates (unchanged ETag/Last-Modified, or local mtime and size).
+    # Comments are not kept, so the parse has to count domain_terms in them
+    # as it goes; a cached parse that did not count all of them is redone.
+    # With OWLPARSER_SNAPSHOT_DIR a memory cache miss falls back to the
+    # parse's snapshot, whose comment corpus answers any domain terms.
+    # Given the parse of a previous release, a new parse updates its
+    # WordNet counts and depths from it (see releases.update). With
+    # processes, labels are looked up across that many processes; without
+    # wordnet, not at all (such a parse is cached, and snapshotted, apart
+    # from the full parse, and only reused without wordnet). on_import is
+    # called with each import read while parsing.
+    if profile is None:
+        profile = Profile()
+    terms = frozenset(term.lower() for term in domain_terms)
+    with profile.phase('load'):
+        if not use_cache:
+            owl = Owl(url, already_converted, progress=progress, domain_terms=terms,
+                      previous=previous, processes=processes, wordnet=wordnet,
+                      on_import=on_import)
+        else:
+            # a parse without WordNet is kept apart from the full parse, so
+            # neither replaces the other; the full one also serves runs
+            # without WordNet
+            for held_wordnet in (True,) if wordnet else (True, False):
+                held_key = ('owl', url, already_converted, held_wordnet)
+                cached = cache.graphs.get(held_key)
+                from_snapshot = cached is None and snapshot.directory is not None
+                if from_snapshot:
+                    cached = snapshot.load(snapshot.directory, url, already_converted, held_wordnet)
+                if cached is not None:
+                    break
+            if cached is not None and not cached.tally.covers(terms):
+                if len(terms | cached.tally.terms) <= MAX_DOMAIN_TERMS:
+                    terms |= cached.tally.terms
+                cached = None
+            try:
+                owl = Owl(url, already_converted, cached.validators if cached else None, progress,
+                          terms, keep_comments=snapshot.directory is not None, previous=previous,
+                          processes=processes, wordnet=wordnet, on_import=on_import)
+            except NotModified:
+                profile.cached['parse'] = True
+                if from_snapshot:
+                    profile.cached['snapshot'] = True
+                    cache.graphs.put(held_key, cached)
+                return cached
+    # time spent waiting for input, the rest of the load is parsing
+    profile.time('download', owl.read_seconds)
+    profile.time('wordnet', owl.tally.wordnet_seconds)
+    profile.time('parse', profile.seconds['load'] - owl.read_seconds - owl.tally.wordnet_seconds)
+    profile.add('bytes_read', owl.bytes_read)
+    profile.add('elements', owl.elements)
+    profile.add('classes', len(owl.graph))
+    profile.add('edges', len(owl.graph.parent_ids))
+    if use_cache:
+        spool = owl.tally.spool
+        if spool is not None:
+            with profile.phase('snapshot'):
+                snapshot.save(owl, snapshot.directory)
+            # the spool is not needed once its comments are in the snapshot
+            # (nor can it be pickled into a disk cache)
+            spool.close()
+            owl.tally.spool = None
+        cache.graphs.put(('owl', url, already_converted, wordnet), owl)
+    return owl
+
+
+def load_closure(url, already_converted=False, use_cache=True, progress=None, profile=None,
+                 domain_terms=(), processes=0, wordnet=True):
+    # The ontology at url merged with its import closure (imports.Closure),
+    # and {'resolved': urls, 'failed': {iri: error}}. Imports are fetched
+    # and parsed on a pool of threads while the ontology is parsed, each
+    # with load_owl, so each is cached on its own. They are parsed without
+    # WordNet, which is looked up once over the merged labels.
+    if profile is None:
+        profile = Profile()
+    terms = frozenset(term.lower() for term in domain_terms)
+
+    def load_import(iri, on_import):
+        return load_owl(iri, use_cache=use_cache, domain_terms=terms, wordnet=False,
+                        on_import=on_import)
+
+    resolver = imports.Resolver(load_import, url=url)
+    try:
+        owl = load_owl(url, already_converted, use_cache, progress, profile, domain_terms,
+                       processes=processes, wordnet=wordnet, on_import=resolver.submit)
+    except BaseException:
+        resolver.close()
+        raise
+    for iri in owl.imports:
+        resolver.submit(iri)
+    with profile.phase('imports'):
+        imported, failed = resolver.results()
+        report = {'resolved': [source.url for source in imported], 'failed': failed}
+        profile.add('imports', len(imported))
+        if not imported:
+            return owl, report
+        key = ('closure', url, already_converted, wordnet)
+        closure = cache.graphs.get(key) if use_cache else None
+        profile.cached['imports'] = (
+            closure is not None and closure.tally.covers(terms) and
+            closure.content_hash == imports.content_hash([owl] + imported))
+        if not profile.cached['imports']:
+            closure = imports.Closure(owl, imported, terms, processes, wordnet)
+            if use_cache:
+                cache.graphs.put(key, closure)
+    return closure, report
+
+
+def owl_quality(url, semiotic_quality_flags, domain, profile=False, already_converted=False,
+                use_cache=True, progress=None, trace=False, diff=False, previous=None,
+                processes=None, wordnet=True, imports=False, mode='full', target_error=None,
+                seed=None):
+    # progress, if given, is called as progress(phase, bytes_read=None,
+    # bytes_total=None) as the parse and each metric phase starts. With
+    # profile the result gets a 'profile' block of phase times, counters
+    # and memory samples; with trace the evaluation runs under cProfile and
+    # the stats are written to OWLPARSER_TRACE_DIR. With diff the ontology
+    # is rescored against the parse already held for url (the last release
+    # evaluated), or with previous against the release at that url, and
+    # the result gets a 'diff' block of change counts and metric deltas.
+    # processes spreads WordNet lookups and domain matching over a process
+    # pool (default OWLPARSER_SCORING_PROCESSES); the scores are the same.
+    # Without wordnet, which needs the semantic layer excluded and no
+    # domain, nltk is never imported and the metrics WordNet feeds
+    # (semantic interpretability and precision, pragmatic
+    # comprehensiveness) are None. With imports the ontology is scored
+    # together with the ontologies it imports (see load_closure), and the
+    # result gets an 'imports' block of the urls resolved and the imports
+    # that failed. With mode 'preview' the metrics WordNet and the domain
+    # feed are estimated from samples of the classes and entities, drawn
+    # with seed until their 95% confidence intervals are within
+    # target_error (defaults OWLPARSER_PREVIEW_SEED and
+    # OWLPARSER_PREVIEW_ERROR); the result gets a 'preview' block of the
+    # sample sizes and intervals.
+    if processes is None:
+        processes = parallel.PROCESSES
+    instrument = Profile()
+    tracer = cProfile.Profile() if trace else None
+    if tracer:
+        tracer.enable()
+    try:
+        result = evaluate(url, semiotic_quality_flags, domain, already_converted, use_cache,
+                          progress, instrument, diff, previous, processes, wordnet, imports,
+                          mode, target_error, seed)
+    except Exception:
+        instrument.finish(error=True)
+        raise
+    finally:
+        if tracer:
+            tracer.disable()
+            instrument.trace = dump_trace(tracer, os.environ.get('OWLPARSER_TRACE_DIR', '.'))
+    instrument.finish()
+    log.debug('profile %s: %s', url, instrument.summary())
+    if profile or trace:
+        result['profile'] = instrument.as_dict()
+    return result
+
+
+def held_parse(url, already_converted, domain_terms):
+    # the cached (or snapshot) full parse of url, if it counted domain_terms
+    key = ('owl', url, already_converted, True)
+    owl = cache.graphs.get(key)
+    if owl is None and snapshot.directory is not None:
+        owl = snapshot.load(snapshot.directory, url, already_converted, True)
+        if owl is not None:
+            cache.graphs.put(key, owl)
+    if owl is not None and owl.tally.covers(frozenset(term.lower() for term in domain_terms)):
+        return owl
+    return None
+
+
+def evaluate(url, semiotic_quality_flags, domain, already_converted, use_cache, progress, profile,
+             diff=False, previous_url=None, processes=0, wordnet=True, imports=False, mode='full',
+             target_error=None, seed=None):
+    if not wordnet and ('semantic' in semiotic_quality_flags or domain or diff or previous_url):
+        raise ValueError('Scoring without WordNet needs the semantic layer excluded, '
+                         'and no domain or diff')
+    if imports and (diff or previous_url):
+        raise ValueError('Import closures cannot be diffed')
+    if mode not in ('full', 'preview'):
+        raise ValueError('Invalid mode. Must be one of: full, preview.')
+    sample = None
+    if mode == 'preview':
+        if diff or previous_url:
+            raise ValueError('Previews cannot be diffed')
+        sample = (preview.ERROR if target_error is None else target_error,
+                  preview.SEED if seed is None else seed)
+        if not sample[0] > 0:
+            raise ValueError('The target error of a preview must be positive')
+    domain_terms = set_domain_synset_list(domain) if domain else ()
+    previous = None
+    if previous_url:
+        previous = load_owl(previous_url, already_converted, use_cache, domain_terms=domain_terms,
+                            processes=processes)
+    elif diff and use_cache:
+        previous = held_parse(url, already_converted, domain_terms)
+    # a preview looks up only the labels it samples
+    load_wordnet = wordnet and sample is None
+    if imports:
+        owl, report = load_closure(url, already_converted, use_cache, progress, profile,
+                                    domain_terms, processes, load_wordnet)
+    else:
+        owl = load_owl(url, already_converted, use_cache, progress, profile, domain_terms,
+                       previous, processes, load_wordnet)
+    result = score(owl, semiotic_quality_flags, domain, use_cache, progress, profile, processes,
+                   wordnet, sample)
+    # previews are estimates, and not ranked with full evaluations
+    if scoreindex.index is not None and sample is None:
+        scoreindex.index.record(url, already_converted,
+                                scoreindex.parameters(semiotic_quality_flags, domain, imports, wordnet),
+                                owl.content_hash, result)
+    if imports:
+        result['imports'] = report
+    if previous is not None:
+        previous_result = score(previous, semiotic_quality_flags, domain, use_cache,
+                                processes=processes)
+        result['diff'] = releases.report(previous, owl, previous_result, result)
+    return result
+
+
+def score(owl, semiotic_quality_flags, domain, use_cache, progress=None, profile=None, processes=0,
+          wordnet=True, sample=None):
+    if profile is None:
+        profile = Profile()
+    result_key = ('quality', owl.url, owl.already_converted, owl.content_hash, domain or None,
+                  tuple(sorted(semiotic_quality_flags)), wordnet, sample)
+    if use_cache:
+        result = cache.results.get(result_key)
+        if result is not None:
+            profile.cached['result'] = True
+            return copy.deepcopy(result)
+
+    quality = OwlQuality(owl, semiotic_quality_flags, domain, progress, profile, processes, wordnet,
+                         sample)
+    structure = quality.structure_stats.metrics()
+
+    result = {
         'overall_quality': quality.overall,
         'syntactic': {
             'quality': quality.overall_syntactic,
             'lawfulness': quality.lawfulness,
             'richness': quality.overall_richness,
             'structure': quality.structure,
+            'tangledness': structure['tangledness'],
+            'fan_out': structure['fan_out'],
         },
         'semantic': {
             'quality': quality.overall_semantic,
@@ -307,6 +569,9 @@ def owl_quality(url, semiotic_quality_flags, domain, debug=False, already_conver
             'comprehensiveness': quality.comprehensiveness,
             'ease_of_use': quality.ease_of_use,
             'relevance': quality.relevance,
+            'depth': structure['depth'],
+            'breadth': structure['breadth'],
+            'descendants': structure['descendants'],
         },
         'social': {
             'quality': quality.overall_social,
@@ -315,3 +580,8 @@ def owl_quality(url, semiotic_quality_flags, domain, debug=False, already_conver
             'recognition': None,
         }
     }
+    if sample is not None:
+        result['preview'] = quality.preview_report()
+    if use_cache:
+        cache.results.put(result_key, copy.deepcopy(result))
+    return result
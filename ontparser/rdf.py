@@ -0,0 +1,236 @@
+# -*- encoding: utf-8 -*-
+from itertools import count
+from urlparse import urldefrag, urljoin
+
+from lxml import etree
+
+from ontparser import limits
+from ontparser.limits import LimitExceeded
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDFS = 'http://www.w3.org/2000/01/rdf-schema#'
+OWL = 'http://www.w3.org/2002/07/owl#'
+XML = 'http://www.w3.org/XML/1998/namespace'
+
+RDF_TYPE = RDF + 'type'
+RDF_FIRST = RDF + 'first'
+RDF_REST = RDF + 'rest'
+RDF_NIL = RDF + 'nil'
+RDFS_SUBCLASS_OF = RDFS + 'subClassOf'
+RDFS_LABEL = RDFS + 'label'
+RDFS_COMMENT = RDFS + 'comment'
+CLASS_TYPES = (OWL + 'Class', RDFS + 'Class')
+OWL_ONTOLOGY = OWL + 'Ontology'
+OWL_OBJECT_PROPERTY = OWL + 'ObjectProperty'
+OWL_DATATYPE_PROPERTY = OWL + 'DatatypeProperty'
+OWL_IMPORTS = OWL + 'imports'
+
+# prefixes used to abbreviate annotation property IRIs the way the OWL/XML
+# converter does (e.g. rdfs:label), so annotations match across formats
+PREFIXES = (
+    ('rdf', RDF),
+    ('rdfs', RDFS),
+    ('owl', OWL),
+    ('xsd', 'http://www.w3.org/2001/XMLSchema#'),
+    ('dc', 'http://purl.org/dc/elements/1.1/'),
+    ('dcterms', 'http://purl.org/dc/terms/'),
+    ('skos', 'http://www.w3.org/2004/02/skos/core#'),
+    ('oboInOwl', 'http://www.geneontology.org/formats/oboInOwl#'),
+    ('obo', 'http://purl.obolibrary.org/obo/'),
+)
+
+
+def abbreviate(iri):
+    for prefix, namespace in PREFIXES:
+        if iri.startswith(namespace):
+            local = iri[len(namespace):]
+            if local and '/' not in local and '#' not in local:
+                return prefix + ':' + local
+    return iri
+
+
+def is_blank(term):
+    return term.startswith('_:')
+
+
+class TripleHandler(object):
+    # Turns RDF triples into the declaration, subclass, label and comment
+    # events that Owl collects, following the OWL 2 RDF mapping for the
+    # parts the quality metrics use: named classes and properties, named
+    # rdfs:subClassOf edges and literal-valued annotation assertions. As in
+    # the OWL/XML path, annotation properties are counted when used, not
+    # when declared.
+
+    def __init__(self, owl):
+        self.owl = owl
+        self.ontologies = set()
+
+    def triple(self, subject, predicate, obj, literal=False):
+        owl = self.owl
+        owl.elements += 1
+        if is_blank(subject):
+            return
+        if literal:
+            if subject in self.ontologies or predicate in owl.data_properties:
+                # ontology header annotations and data property assertions
+                # are not annotation assertions
+                return
+            if predicate == RDFS_LABEL:
+                owl.add_annotation_property('rdfs:label')
+                owl.add_label(obj, [subject])
+            elif predicate == RDFS_COMMENT:
+                owl.add_annotation_property('rdfs:comment')
+                owl.add_comment(obj, [subject])
+            elif predicate != RDF_TYPE:
+                owl.add_annotation_property(abbreviate(predicate))
+        elif predicate == RDF_TYPE:
+            if obj in CLASS_TYPES:
+                owl.add_class(subject)
+            elif obj == OWL_OBJECT_PROPERTY:
+                owl.add_object_property(subject)
+            elif obj == OWL_DATATYPE_PROPERTY:
+                owl.add_data_property(subject)
+            elif obj == OWL_ONTOLOGY:
+                self.ontologies.add(subject)
+        elif predicate == RDFS_SUBCLASS_OF:
+            if not is_blank(obj):
+                owl.add_subclass(subject, obj)
+        elif predicate == OWL_IMPORTS:
+            if not is_blank(obj):
+                owl.add_import(obj)
+
+
+def iri_of(tag):
+    # '{namespace}local' -> 'namespacelocal'
+    if tag[0] == '{':
+        namespace, _, local = tag[1:].partition('}')
+        return namespace + local
+    return tag
+
+
+RDF_ABOUT = '{%s}about' % RDF
+RDF_ID = '{%s}ID' % RDF
+RDF_NODE_ID = '{%s}nodeID' % RDF
+RDF_RESOURCE = '{%s}resource' % RDF
+RDF_DATATYPE = '{%s}datatype' % RDF
+RDF_PARSE_TYPE = '{%s}parseType' % RDF
+RDF_TYPE_ATTRIBUTE = '{%s}type' % RDF
+RDF_DESCRIPTION = '{%s}Description' % RDF
+RDF_LI = RDF + 'li'
+XML_PREFIX = '{%s}' % XML
+SYNTAX_ATTRIBUTES = (RDF_ABOUT, RDF_ID, RDF_NODE_ID, RDF_RESOURCE, RDF_DATATYPE, RDF_PARSE_TYPE)
+
+
+class RdfXmlParser(object):
+    # Streaming RDF/XML front end. Each top-level node element is turned
+    # into triples once it has been parsed completely, then discarded; one
+    # with more than limits.MAX_ELEMENTS elements raises LimitExceeded.
+
+    def __init__(self, handler, base=''):
+        self.handler = handler
+        self.base = base
+        self.blank_ids = count()
+
+    def blank(self):
+        return '_:b%d' % next(self.blank_ids)
+
+    def resolve(self, elem, reference):
+        return urljoin(elem.base or self.base, reference)
+
+    def parse(self, chunks):
+        parser = etree.XMLPullParser(('start', 'end'), base_url=self.base or None)
+        max_elements = limits.MAX_ELEMENTS
+        depth = 0
+        # elements of the current top-level node element
+        held = 0
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    depth += 1
+                    held += 1
+                    if max_elements and held > max_elements:
+                        raise LimitExceeded('Node element with more than {} elements'.format(
+                            max_elements))
+                    continue
+                depth -= 1
+                if depth == 1:
+                    self.node_element(elem)
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+                    held = 0
+        parser.close()
+
+    def subject_of(self, elem):
+        about = elem.get(RDF_ABOUT)
+        if about is not None:
+            return self.resolve(elem, about)
+        rdf_id = elem.get(RDF_ID)
+        if rdf_id is not None:
+            return urldefrag(self.resolve(elem, ''))[0] + '#' + rdf_id
+        node_id = elem.get(RDF_NODE_ID)
+        if node_id is not None:
+            return '_:' + node_id
+        return self.blank()
+
+    def node_element(self, elem, subject=None):
+        if not isinstance(elem.tag, basestring):
+            # comment or processing instruction
+            return None
+        triple = self.handler.triple
+        if subject is None:
+            subject = self.subject_of(elem)
+            if elem.tag != RDF_DESCRIPTION:
+                triple(subject, RDF_TYPE, iri_of(elem.tag))
+        for name, value in elem.items():
+            if name in SYNTAX_ATTRIBUTES or not name.startswith('{') or name.startswith(XML_PREFIX):
+                continue
+            if name == RDF_TYPE_ATTRIBUTE:
+                triple(subject, RDF_TYPE, self.resolve(elem, value))
+            else:
+                triple(subject, iri_of(name), value, literal=True)
+        li = count(1)
+        for child in elem:
+            if isinstance(child.tag, basestring):
+                self.property_element(subject, child, li)
+        return subject
+
+    def property_element(self, subject, elem, li):
+        triple = self.handler.triple
+        predicate = iri_of(elem.tag)
+        if predicate == RDF_LI:
+            predicate = RDF + '_%d' % next(li)
+        parse_type = elem.get(RDF_PARSE_TYPE)
+        resource = elem.get(RDF_RESOURCE)
+        node_id = elem.get(RDF_NODE_ID)
+        children = [child for child in elem if isinstance(child.tag, basestring)]
+        if parse_type == 'Resource':
+            obj = self.blank()
+            triple(subject, predicate, obj)
+            self.node_element(elem, obj)
+        elif parse_type == 'Collection':
+            items = [self.node_element(child) for child in children]
+            obj = RDF_NIL
+            for item in reversed(items):
+                cell = self.blank()
+                triple(cell, RDF_FIRST, item)
+                triple(cell, RDF_REST, obj)
+                obj = cell
+            triple(subject, predicate, obj)
+        elif parse_type == 'Literal':
+            text = (elem.text or '') + ''.join(
+                etree.tostring(child, encoding=unicode) for child in elem)
+            triple(subject, predicate, text, literal=True)
+        elif resource is not None:
+            triple(subject, predicate, self.resolve(elem, resource))
+        elif node_id is not None:
+            triple(subject, predicate, '_:' + node_id)
+        elif children:
+            triple(subject, predicate, self.node_element(children[0]))
+        else:
+            triple(subject, predicate, elem.text or '', literal=True)
+
+
+def parse_rdfxml(owl, chunks):
+    RdfXmlParser(TripleHandler(owl), owl.url if owl.url.startswith('http') else '').parse(chunks)
@@ -0,0 +1,208 @@
+# -*- encoding: utf-8 -*-
+import time
+from array import array
+from collections import Counter, deque
+
+from ontparser import lexicon
+from ontparser.hierarchy import DepthResult, compute_depths
+
+# what is counted between two releases of an ontology; comments are not
+# kept per entity, so only their net change is known
+CHANGES = ('classes_added', 'classes_removed', 'subclass_edges_added', 'subclass_edges_removed',
+           'labels_changed', 'properties_added', 'properties_removed', 'comments')
+
+
+class Comparison(object):
+    # Class-by-class comparison of a release (owl) with the previous one.
+    # old_ids maps each class id of owl to its id in previous (-1 if new);
+    # moved holds the classes whose superclasses changed, new classes
+    # included; relabeled the classes whose label changed or that are new;
+    # removed the ids in previous of classes that are gone.
+
+    def __init__(self, previous, owl):
+        graph = owl.graph
+        old = previous.graph
+        old_graph_ids = old.ids
+        iris = graph.iris
+        old_iris = old.iris
+        labels = graph.labels
+        old_labels = old.labels
+        changes = self.changes = dict.fromkeys(CHANGES, 0)
+        self.old_ids = array('i', [-1]) * len(graph)
+        self.moved = []
+        self.relabeled = []
+
+        for node_id, iri in enumerate(iris):
+            old_id = old_graph_ids.get(iri)
+            if old_id is None:
+                changes['classes_added'] += 1
+                changes['subclass_edges_added'] += graph.num_parents(node_id)
+                self.moved.append(node_id)
+                self.relabeled.append(node_id)
+                continue
+            self.old_ids[node_id] = old_id
+            if labels[node_id] != old_labels[old_id]:
+                changes['labels_changed'] += 1
+                self.relabeled.append(node_id)
+            parents = [iris[p] for p in graph.parents(node_id)]
+            old_parents = [old_iris[p] for p in old.parents(old_id)]
+            if parents != old_parents:
+                parents = set(parents)
+                old_parents = set(old_parents)
+                if parents != old_parents:
+                    changes['subclass_edges_added'] += len(parents - old_parents)
+                    changes['subclass_edges_removed'] += len(old_parents - parents)
+                    self.moved.append(node_id)
+
+        self.removed = []
+        if len(old) > len(graph) - changes['classes_added']:
+            graph_ids = graph.ids
+            self.removed = [old_id for old_id, iri in enumerate(old_iris) if iri not in graph_ids]
+            for old_id in self.removed:
+                changes['subclass_edges_removed'] += old.num_parents(old_id)
+        changes['classes_removed'] = len(self.removed)
+
+        for name in ('object_properties', 'data_properties', 'annotations'):
+            properties = getattr(owl, name).viewkeys()
+            old_properties = getattr(previous, name).viewkeys()
+            changes['properties_added'] += len(properties - old_properties)
+            changes['properties_removed'] += len(old_properties - properties)
+        changes['comments'] = owl.tally.comment_count - previous.tally.comment_count
+
+
+def update(previous, owl):
+    # Fill in what a parse without WordNet lookups left out, starting from
+    # previous: the WordNet counts and synonym totals, looking up only
+    # changed labels, and the class depths, recomputing only the classes
+    # below a changed subclass edge. Returns the comparison's change counts.
+    comparison = Comparison(previous, owl)
+    graph = owl.graph
+    old = previous.graph
+    old_ids = comparison.old_ids
+
+    started = time.time()
+    tally = owl.tally
+    old_tally = previous.tally
+    tally.count_definitions = old_tally.count_definitions
+    tally.count_defined = old_tally.count_defined
+    tally.synonyms = Counter(old_tally.synonyms)
+    wn_count = graph.wn_count
+    old_wn_count = old.wn_count
+    for node_id, old_id in enumerate(old_ids):
+        if old_id >= 0:
+            wn_count[node_id] = old_wn_count[old_id]
+    lookup = lexicon.wordnet.lookup
+    for old_id in comparison.removed:
+        tally.add_entry(lookup(old.labels[old_id]), -1)
+    for node_id in comparison.relabeled:
+        old_id = old_ids[node_id]
+        if old_id >= 0:
+            tally.add_entry(lookup(old.labels[old_id]), -1)
+        entry = lookup(graph.labels[node_id])
+        tally.add_entry(entry, 1)
+        wn_count[node_id] = entry.count
+    tally.wordnet_seconds += time.time() - started
+
+    graph.depths = update_depths(old, graph, old_ids, comparison.moved)
+    return comparison.changes
+
+
+def update_depths(old, graph, old_ids, moved):
+    # A class keeps its depth unless its superclasses, or those of one of
+    # its ancestors, changed; those classes (moved and everything below
+    # them) are placed again with the topological pass of compute_depths,
+    # seeded with the depths of their unchanged parents. Subclass cycles
+    # are broken in an order that depends on the whole graph, so an
+    # ontology with one is recomputed in full.
+    if old.depths is None or old.depths.cycle_nodes:
+        return compute_depths(graph)
+    n = len(graph)
+    affected = bytearray(n)
+    region = []
+    queue = deque(moved)
+    for node_id in moved:
+        affected[node_id] = 1
+    while queue:
+        node_id = queue.popleft()
+        region.append(node_id)
+        for child_id in graph.children(node_id):
+            if not affected[child_id]:
+                affected[child_id] = 1
+                queue.append(child_id)
+
+    max_depth = graph.max_depth
+    old_max_depth = old.max_depth
+    for node_id, old_id in enumerate(old_ids):
+        if not affected[node_id]:
+            max_depth[node_id] = old_max_depth[old_id]
+    pending = {}
+    for node_id in region:
+        depth = 0
+        count = 0
+        for parent_id in graph.parents(node_id):
+            if affected[parent_id]:
+                count += 1
+            elif max_depth[parent_id] + 1 > depth:
+                depth = max_depth[parent_id] + 1
+        max_depth[node_id] = depth
+        pending[node_id] = count
+        if not count:
+            queue.append(node_id)
+    resolved = 0
+    while queue:
+        node_id = queue.popleft()
+        resolved += 1
+        depth = max_depth[node_id] + 1
+        for child_id in graph.children(node_id):
+            if depth > max_depth[child_id]:
+                max_depth[child_id] = depth
+            pending[child_id] -= 1
+            if not pending[child_id]:
+                queue.append(child_id)
+    if resolved < len(region):
+        # the release added a subclass cycle
+        return compute_depths(graph)
+
+    parent_offsets = graph.parent_offsets
+    child_offsets = graph.child_offsets
+    root_node = graph.root_node
+    leaf_nodes = []
+    root_nodes = []
+    for node_id in xrange(n):
+        if parent_offsets[node_id + 1] == parent_offsets[node_id]:
+            root_node[node_id] = 1
+            root_nodes.append(node_id)
+        if child_offsets[node_id + 1] == child_offsets[node_id]:
+            leaf_nodes.append(node_id)
+    return DepthResult(leaf_nodes, root_nodes, [])
+
+
+def deltas(result, previous_result):
+    # result minus previous_result, metric by metric (None where either
+    # is not a number)
+    delta = {}
+    for name, value in result.iteritems():
+        old_value = previous_result.get(name)
+        if isinstance(value, dict):
+            delta[name] = deltas(value, old_value or {})
+        elif isinstance(value, (int, float)) and isinstance(old_value, (int, float)):
+            delta[name] = round(value - old_value, 3)
+        else:
+            delta[name] = None
+    return delta
+
+
+def report(previous, owl, previous_result, result):
+    # the 'diff' block of an owl_quality result
+    if owl is previous:
+        changes = dict.fromkeys(CHANGES, 0)
+    elif getattr(owl, 'changes', None) and owl.changes[0] == previous.content_hash:
+        changes = owl.changes[1]
+    else:
+        # owl was parsed on its own (or against another release)
+        changes = Comparison(previous, owl).changes
+    return {
+        'previous': {'url': previous.url, 'content_hash': previous.content_hash},
+        'changes': changes,
+        'deltas': deltas(result, previous_result),
+    }
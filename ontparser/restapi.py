@@ -1,31 +1,227 @@
-from flask_restful import Resource, Api, reqparse, inputs
+import json
+import os
 
-from ontparser import app
-from ontparser.quality import owl_quality
+from flask import Response, request, stream_with_context
+from flask_restful import Resource, Api, abort, reqparse, inputs
+
+from ontparser import app, export, scoreindex
+from ontparser.batch import run_batch
+from ontparser.instrument import metrics
+from ontparser.jobs import jobs
+from ontparser.limits import LimitExceeded
+from ontparser.quality import load_owl, owl_quality
 
 
 api = Api(app)
 
+SEMIOTIC_QUALITY_FLAGS = {'syntactic', 'semantic', 'pragmatic', 'social'}
+
+
+def quality_parser():
+    parser = reqparse.RequestParser()
+    parser.add_argument('url', required=True, help='url cannot be blank!')
+    parser.add_argument('exclude_semiotic_layer', action='append')
+    parser.add_argument('domain')
+    parser.add_argument('already_converted', type=inputs.boolean, default=False)
+    return parser
+
+
+def semiotic_quality_flags(exclude_semiotic_layer):
+    exclude_semiotic_layer = set(exclude_semiotic_layer or ())
+    if exclude_semiotic_layer & SEMIOTIC_QUALITY_FLAGS != exclude_semiotic_layer:
+        raise ValueError(
+            'Invalid semiotic layer. Must be one of: {}.'.format(', '.join(SEMIOTIC_QUALITY_FLAGS)))
+    return SEMIOTIC_QUALITY_FLAGS - exclude_semiotic_layer
+
+
+# the owl_quality options /rest/execute takes
+EXECUTE_OPTIONS = ('profile', 'already_converted', 'trace', 'diff', 'previous', 'imports', 'mode',
+                   'target_error', 'seed')
+
+
+def execute_arguments():
+    # The parameters of /rest/execute, checked; aborts with 400 if they
+    # cannot be scored. Shared by Main and the async server's execute.
+    parser = quality_parser()
+    parser.add_argument('profile', type=inputs.boolean, default=False)
+    parser.add_argument('trace', type=inputs.boolean, default=False)
+    parser.add_argument('diff', type=inputs.boolean, default=False)
+    parser.add_argument('previous')
+    parser.add_argument('imports', type=inputs.boolean, default=False)
+    parser.add_argument('mode', choices=('full', 'preview'), default='full')
+    parser.add_argument('target_error', type=float)
+    parser.add_argument('seed', type=int)
+    args = parser.parse_args()
+    if args.trace and not os.environ.get('OWLPARSER_TRACE_DIR'):
+        abort(400, message='Tracing is disabled; set OWLPARSER_TRACE_DIR to enable it')
+    if args.target_error is not None and not args.target_error > 0:
+        abort(400, message='target_error must be positive')
+    if args.mode == 'preview' and (args.diff or args.previous):
+        abort(400, message='Previews cannot be diffed')
+    if args.imports and (args.diff or args.previous):
+        abort(400, message='Import closures cannot be diffed')
+    try:
+        args.semiotic_quality_flags = semiotic_quality_flags(args.exclude_semiotic_layer)
+    except ValueError as e:
+        abort(400, message=str(e))
+    return args
+
+
+def execute_options(args):
+    return dict((name, args[name]) for name in EXECUTE_OPTIONS)
+
 
 class Main(Resource):
+    def get(self):
+        args = execute_arguments()
+        try:
+            return owl_quality(args.url, args.semiotic_quality_flags, args.domain,
+                               **execute_options(args))
+        except LimitExceeded as e:
+            abort(413, message=str(e))
+
+
+class Jobs(Resource):
+    def post(self):
+        args = quality_parser().parse_args()
+        try:
+            flags = semiotic_quality_flags(args.exclude_semiotic_layer)
+        except ValueError as e:
+            abort(400, message=str(e))
+        state = jobs.submit(args.url, flags, args.domain, already_converted=args.already_converted)
+        return state, 202, {'Location': api.url_for(Job, job_id=state['id'])}
+
+
+class Job(Resource):
+    def get(self, job_id):
+        state = jobs.get(job_id)
+        if state is None:
+            abort(404, message='Unknown job {}'.format(job_id))
+        return state
+
+
+class Batch(Resource):
+    # Body: a JSON list of items, or {"items": [...], "timeout": seconds}.
+    # An item is a url string or an object with the /rest/execute
+    # parameters and an optional per-item timeout. Outcomes are streamed
+    # back as newline-delimited JSON as each item finishes.
+    def post(self):
+        body = request.get_json(force=True, silent=True)
+        if isinstance(body, dict):
+            entries = body.get('items')
+            timeout = body.get('timeout')
+        else:
+            entries = body
+            timeout = None
+        if not isinstance(entries, list):
+            abort(400, message='Expected a list of items')
+        items = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                entry = {'url': entry}
+            if not entry.get('url'):
+                abort(400, message='url cannot be blank!')
+            try:
+                flags = semiotic_quality_flags(entry.get('exclude_semiotic_layer'))
+            except ValueError as e:
+                abort(400, message=str(e))
+            item = {
+                'url': entry['url'],
+                'semiotic_quality_flags': flags,
+                'domain': entry.get('domain'),
+                'already_converted': bool(entry.get('already_converted')),
+            }
+            if entry.get('timeout') or timeout:
+                try:
+                    item['timeout'] = inputs.positive(entry.get('timeout') or timeout)
+                except (TypeError, ValueError):
+                    abort(400, message='timeout must be a positive number of seconds')
+            items.append(item)
+        outcomes = (json.dumps(outcome, sort_keys=True) + '\n' for outcome in run_batch(items))
+        return Response(stream_with_context(outcomes), mimetype='application/x-ndjson')
+
+
+class Hierarchy(Resource):
+    # Streams one section of a parsed ontology (the class tree, or the
+    # labeled or unlabeled classes) as NDJSON or as a JSON list, a page
+    # (offset, limit) at a time; the tree can start at a class (root) and
+    # stop at a depth. See export.tree for the records.
     def get(self):
         parser = reqparse.RequestParser()
         parser.add_argument('url', required=True, help='url cannot be blank!')
+        parser.add_argument('already_converted', type=inputs.boolean, default=False)
+        parser.add_argument('section', choices=export.SECTIONS, default='tree')
+        parser.add_argument('format', choices=('ndjson', 'json'), default='ndjson')
+        parser.add_argument('offset', type=inputs.natural, default=0)
+        parser.add_argument('limit', type=inputs.natural)
+        parser.add_argument('depth', type=inputs.natural)
+        parser.add_argument('root')
+        args = parser.parse_args()
+        try:
+            # only the tree shows WordNet counts
+            owl = load_owl(args.url, args.already_converted, wordnet=args.section == 'tree')
+        except LimitExceeded as e:
+            abort(413, message=str(e))
+        graph = owl.graph
+        if args.section == 'tree':
+            if args.root is not None and args.root not in graph.ids:
+                abort(404, message='Unknown class {}'.format(args.root))
+            records = export.tree(graph, args.root, args.depth, args.offset, args.limit)
+        else:
+            records = getattr(export, args.section)(graph, args.offset, args.limit)
+        if args.format == 'json':
+            return Response(stream_with_context(export.chunked(export.json_list(records))),
+                            mimetype='application/json')
+        return Response(stream_with_context(export.chunked(export.ndjson(records))),
+                        mimetype='application/x-ndjson')
+
+
+class Scores(Resource):
+    # Queries the score index: the stats and top-k ranking of a metric
+    # ('overall_quality', a layer, or 'layer.metric') over the ontologies
+    # evaluated with the same parameters, or with url the standing of
+    # that ontology on every metric. Nothing is rescored.
+    def get(self):
+        if scoreindex.index is None:
+            abort(400, message='The score index is disabled; set OWLPARSER_SCORE_INDEX to enable it')
+        parser = reqparse.RequestParser()
+        parser.add_argument('metric', default='overall_quality')
+        parser.add_argument('limit', type=inputs.natural, default=10)
+        parser.add_argument('order', choices=('desc', 'asc'), default='desc')
+        parser.add_argument('url')
         parser.add_argument('exclude_semiotic_layer', action='append')
         parser.add_argument('domain')
         parser.add_argument('already_converted', type=inputs.boolean, default=False)
-        parser.add_argument('debug', type=inputs.boolean, default=False)  # remove this when in production
+        parser.add_argument('imports', type=inputs.boolean, default=False)
+        parser.add_argument('wordnet', type=inputs.boolean, default=True)
         args = parser.parse_args()
-        semiotic_quality_flags = {'syntactic', 'semantic', 'pragmatic', 'social'}
-        if args.exclude_semiotic_layer:
-            exclude_semiotic_layer = set(args.exclude_semiotic_layer)
-        else:
-            exclude_semiotic_layer = set()
-        if exclude_semiotic_layer & semiotic_quality_flags != exclude_semiotic_layer:
-            raise ValueError(
-                'Invalid semiotic layer. Must be one of: {}.'.format(', '.join(semiotic_quality_flags)))
-        return owl_quality(args.url, semiotic_quality_flags - exclude_semiotic_layer,
-                           args.domain, already_converted=args.already_converted, debug=args.debug)
+        try:
+            flags = semiotic_quality_flags(args.exclude_semiotic_layer)
+        except ValueError as e:
+            abort(400, message=str(e))
+        params = scoreindex.parameters(flags, args.domain, args.imports, args.wordnet)
+        if args.url:
+            standing = scoreindex.index.lookup(params, args.url, args.already_converted)
+            if standing is None:
+                abort(404, message='{} has not been scored with these parameters'.format(args.url))
+            return standing
+        return {
+            'metric': scoreindex.metric_name(args.metric),
+            'stats': scoreindex.index.stats(params, args.metric),
+            'ranking': scoreindex.index.top(params, args.metric, args.limit,
+                                            ascending=args.order == 'asc'),
+        }
+
+
+class Metrics(Resource):
+    def get(self):
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 api.add_resource(Main, '/rest/execute')
+api.add_resource(Jobs, '/rest/jobs')
+api.add_resource(Job, '/rest/jobs/<job_id>')
+api.add_resource(Batch, '/rest/batch')
+api.add_resource(Hierarchy, '/rest/hierarchy')
+api.add_resource(Scores, '/rest/scores')
+api.add_resource(Metrics, '/metrics')
@@ -0,0 +1,227 @@
+# -*- encoding: utf-8 -*-
+import json
+import os
+import time
+
+from ontparser.database import Database
+
+# Index of owl_quality results in an SQLite file, so that ontologies can be
+# ranked and compared without rescoring them. Every evaluation is kept,
+# keyed by source (url, already_converted), content hash and scoring
+# parameters; the metrics of the latest evaluation of each source under
+# each set of parameters are indexed by value, with running counts and
+# totals per metric, so top-k queries, min/max and means are index
+# lookups. Percentiles take one pass over the metric's index entries, and a
+# percentile rank counts the entries on the smaller side of the value, so
+# both grow with the number of sources scored.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    already_converted INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    evaluated REAL NOT NULL,
+    result TEXT NOT NULL,
+    current INTEGER NOT NULL,
+    UNIQUE (url, already_converted, params, content_hash)
+);
+CREATE INDEX IF NOT EXISTS current_evaluations
+    ON evaluations (url, already_converted, params) WHERE current;
+CREATE TABLE IF NOT EXISTS metrics (
+    evaluation_id INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metric_values ON metrics (params, name, value);
+CREATE INDEX IF NOT EXISTS evaluation_metrics ON metrics (evaluation_id);
+CREATE TABLE IF NOT EXISTS stats (
+    params TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (params, name)
+);
+"""
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def parameters(semiotic_quality_flags, domain=None, imports=False, wordnet=True):
+    # the scoring parameters results are only comparable under
+    return json.dumps([sorted(semiotic_quality_flags), domain or None, bool(imports),
+                       bool(wordnet)])
+
+
+def metric_values(result, prefix=''):
+    # 'overall_quality', 'syntactic.quality', ... -> numeric value
+    values = {}
+    for name, value in result.iteritems():
+        if isinstance(value, dict):
+            if not prefix:
+                values.update(metric_values(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + name] = float(value)
+    return values
+
+
+def metric_name(metric):
+    # a layer stands for its quality
+    if metric in ('syntactic', 'semantic', 'pragmatic', 'social'):
+        return metric + '.quality'
+    return metric
+
+
+class ScoreIndex(Database):
+
+    def __init__(self, path):
+        Database.__init__(self, path, SCHEMA)
+
+    def record(self, url, already_converted, params, content_hash, result):
+        # Adds an evaluation and makes it the current one of its source
+        # and parameters. Only the metric layers of result are kept (no
+        # profile, diff or imports blocks).
+        scores = dict((name, value) for name, value in result.iteritems()
+                      if name not in ('profile', 'diff', 'imports'))
+        source = (url, bool(already_converted), params)
+        # an unchanged source is only read, so that repeated evaluations of
+        # one ontology do not take the write lock; checked again under it
+        current = self.current(self.connection(), source)
+        if current is not None and current[1] == content_hash:
+            return
+        with self.transaction() as db:
+            current = self.current(db, source)
+            if current is not None and current[1] == content_hash:
+                return
+            if current is not None:
+                self.retire(db, current[0], params)
+            cursor = db.execute(
+                'INSERT OR REPLACE INTO evaluations (url, already_converted, params, content_hash, '
+                'evaluated, result, current) VALUES (?, ?, ?, ?, ?, ?, 1)',
+                source + (content_hash, time.time(), json.dumps(scores, sort_keys=True)))
+            evaluation_id = cursor.lastrowid
+            for name, value in metric_values(scores).iteritems():
+                db.execute('INSERT INTO metrics VALUES (?, ?, ?, ?)',
+                           (evaluation_id, params, name, value))
+                db.execute('INSERT OR IGNORE INTO stats VALUES (?, ?, 0, 0.0)', (params, name))
+                db.execute('UPDATE stats SET count = count + 1, total = total + ? '
+                           'WHERE params = ? AND name = ?', (value, params, name))
+
+    def current(self, db, source):
+        # (id, content_hash) of the current evaluation of source, or None
+        return db.execute('SELECT id, content_hash FROM evaluations '
+                          'WHERE url = ? AND already_converted = ? AND params = ? AND current',
+                          source).fetchone()
+
+    def retire(self, db, evaluation_id, params):
+        # take a superseded evaluation's metrics out of the index
+        for name, value in db.execute('SELECT name, value FROM metrics WHERE evaluation_id = ?',
+                                      (evaluation_id,)).fetchall():
+            db.execute('UPDATE stats SET count = count - 1, total = total - ? '
+                       'WHERE params = ? AND name = ?', (value, params, name))
+        db.execute('DELETE FROM metrics WHERE evaluation_id = ?', (evaluation_id,))
+        db.execute('UPDATE evaluations SET current = 0 WHERE id = ?', (evaluation_id,))
+
+    def stats(self, params, metric):
+        # count, min, max, mean and percentiles of a metric over the current
+        # evaluations, or None if there are none
+        name = metric_name(metric)
+        db = self.connection()
+        row = db.execute('SELECT count, total FROM stats WHERE params = ? AND name = ?',
+                         (params, name)).fetchone()
+        if row is None or not row[0]:
+            return None
+        count, total = row
+        low, high = db.execute('SELECT MIN(value), MAX(value) FROM metrics '
+                               'WHERE params = ? AND name = ?', (params, name)).fetchone()
+        # nearest ranks, read in one ordered pass (an OFFSET per percentile
+        # would step over the lower ranks again each time)
+        ranks = [(max(1, -(-percentile * count // 100)), 'p%d' % percentile)
+                 for percentile in PERCENTILES]
+        percentiles = {}
+        values = db.execute('SELECT value FROM metrics WHERE params = ? AND name = ? '
+                            'ORDER BY value LIMIT ?', (params, name, ranks[-1][0]))
+        for rank, (value,) in enumerate(values, 1):
+            for wanted, key in ranks:
+                if wanted == rank:
+                    percentiles[key] = value
+        return {
+            'metric': name,
+            'count': count,
+            'min': low,
+            'max': high,
+            'mean': round(total / count, 3),
+            'percentiles': percentiles,
+        }
+
+    def standing(self, db, params, name, value, stats):
+        # percentile rank (share of the corpus at or below value) and
+        # min-max normalized value; the smaller side of value is counted
+        count = stats['count']
+        if value >= stats['percentiles']['p50']:
+            above = db.execute('SELECT COUNT(*) FROM metrics WHERE params = ? AND name = ? '
+                               'AND value > ?', (params, name, value)).fetchone()[0]
+            at_or_below = count - above
+        else:
+            at_or_below = db.execute('SELECT COUNT(*) FROM metrics WHERE params = ? AND name = ? '
+                                     'AND value <= ?', (params, name, value)).fetchone()[0]
+        spread = stats['max'] - stats['min']
+        return {
+            'percentile': round(100.0 * at_or_below / count, 1),
+            'normalized': round((value - stats['min']) / spread, 3) if spread else 1.0,
+        }
+
+    def top(self, params, metric, limit=10, ascending=False):
+        # the current evaluations best (or worst) on metric
+        name = metric_name(metric)
+        stats = self.stats(params, name)
+        if stats is None:
+            return []
+        db = self.connection()
+        rows = db.execute(
+            'SELECT e.url, e.already_converted, e.content_hash, e.evaluated, m.value '
+            'FROM metrics m JOIN evaluations e ON e.id = m.evaluation_id '
+            'WHERE m.params = ? AND m.name = ? ORDER BY m.value {} LIMIT ?'.format(
+                'ASC' if ascending else 'DESC'), (params, name, limit)).fetchall()
+        ranking = []
+        for url, already_converted, content_hash, evaluated, value in rows:
+            entry = {
+                'url': url,
+                'already_converted': bool(already_converted),
+                'content_hash': content_hash,
+                'evaluated': evaluated,
+                'value': value,
+            }
+            entry.update(self.standing(db, params, name, value, stats))
+            ranking.append(entry)
+        return ranking
+
+    def lookup(self, params, url, already_converted=False):
+        # the current evaluation of url, with the standing of each metric,
+        # or None if it has not been evaluated under params
+        db = self.connection()
+        row = db.execute('SELECT content_hash, evaluated, result FROM evaluations '
+                         'WHERE url = ? AND already_converted = ? AND params = ? AND current',
+                         (url, bool(already_converted), params)).fetchone()
+        if row is None:
+            return None
+        content_hash, evaluated, result = row
+        standings = {}
+        for name, value in sorted(metric_values(json.loads(result)).iteritems()):
+            standings[name] = dict(self.standing(db, params, name, value, self.stats(params, name)),
+                                   value=value)
+        return {
+            'url': url,
+            'already_converted': bool(already_converted),
+            'content_hash': content_hash,
+            'evaluated': evaluated,
+            'result': json.loads(result),
+            'standing': standings,
+        }
+
+
+# the index; without OWLPARSER_SCORE_INDEX (a file path) nothing is recorded
+index = ScoreIndex(os.environ['OWLPARSER_SCORE_INDEX']) if os.environ.get(
+    'OWLPARSER_SCORE_INDEX') else None
@@ -0,0 +1,260 @@
+# -*- encoding: utf-8 -*-
+import cPickle as pickle
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from collections import Counter
+from contextlib import closing
+from itertools import izip
+
+from ontparser.graph import Graph
+from ontparser.hierarchy import DepthResult, compute_depths
+from ontparser.owlparser import Node, Owl
+from ontparser.tally import Tally
+
+# A snapshot is one file holding a parsed Owl:
+#
+#   MAGIC, the length of the index as a 4-byte little-endian integer, the
+#   index (JSON: section name -> [offset, length] from the end of the
+#   header, plus the byte order and int size the arrays were written
+#   with and the content hash), then the sections, each starting at a
+#   multiple of 8 bytes.
+#
+# Class IRIs and labels are NUL-separated UTF-8; adjacency, depth and
+# WordNet columns are raw int arrays; comments are the lower-cased,
+# NUL-separated comment texts, searched in place through mmap for domain
+# terms the parse did not count. Everything else (property tables, tally
+# counters, validators) is pickled into the 'tables' section.
+MAGIC = 'OWLSNAP\x01'
+ARRAYS = ('parent_offsets', 'parent_ids', 'child_offsets', 'child_ids', 'max_depth', 'wn_count')
+DEPTHS = ('leaf_nodes', 'root_nodes', 'cycle_nodes')
+SEPARATOR = '\x00'
+
+
+class CommentCorpus(object):
+    # NUL-separated, lower-cased UTF-8 comment texts inside a snapshot file.
+    # The file's header (with the content hash of the ontology) identifies
+    # the snapshot: a corpus unpickled after its file was removed, or
+    # replaced by another snapshot of the url, is stale, and the Tally
+    # holding it no longer covers terms it did not count.
+
+    def __init__(self, path, header, offset, length):
+        self.path = path
+        self.header = header
+        self.offset = offset
+        self.length = length
+        self._open()
+
+    def _open(self):
+        self._map = None
+        try:
+            with open(self.path, 'rb') as snapshot_file:
+                if snapshot_file.read(len(self.header)) == self.header:
+                    self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError):
+            pass
+
+    @property
+    def stale(self):
+        return self._map is None
+
+    def __getstate__(self):
+        return {'path': self.path, 'header': self.header, 'offset': self.offset,
+                'length': self.length}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def count(self, term):
+        # number of comments containing term (already lower-cased)
+        term = term.encode('utf-8')
+        corpus = self._map
+        end = self.offset + self.length
+        matches = 0
+        pos = corpus.find(term, self.offset, end)
+        while pos != -1:
+            matches += 1
+            # skip the rest of this comment: each counts once
+            pos = corpus.find(SEPARATOR, pos + len(term), end)
+            if pos == -1:
+                break
+            pos = corpus.find(term, pos + 1, end)
+        return matches
+
+
+def snapshot_path(directory, url, already_converted, wordnet=True):
+    name = hashlib.sha1(repr((url, already_converted, bool(wordnet)))).hexdigest()
+    return os.path.join(directory, name + '.snap')
+
+
+def padding(length):
+    # sections start at multiples of 8 bytes, so the int arrays are aligned
+    return -length % 8
+
+
+def encode_strings(strings):
+    return SEPARATOR.join(strings).encode('utf-8')
+
+
+def decode_strings(data, count):
+    if not count:
+        return []
+    return data.decode('utf-8').split(u'\x00')
+
+
+def save(owl, directory):
+    # write owl's snapshot (computing depths if no score has done so yet)
+    # and return its path; owl.tally must still hold the comment spool
+    graph = owl.graph
+    if graph.depths is None:
+        graph.depths = compute_depths(graph)
+    tally = owl.tally
+    tables = {
+        'url': owl.url,
+        'already_converted': owl.already_converted,
+        'validators': owl.validators,
+        'content_hash': owl.content_hash,
+        'format': owl.format,
+        'bytes_read': owl.bytes_read,
+        'elements': owl.elements,
+        'wordnet': owl.wordnet,
+        'imports': owl.imports,
+        'object_properties': [(n.iri, n.label) for n in owl.object_properties.itervalues()],
+        'data_properties': [(n.iri, n.label) for n in owl.data_properties.itervalues()],
+        'annotations': [(n.iri, n.label) for n in owl.annotations.itervalues()],
+        'tally': {
+            'terms': tally.terms,
+            'comment_count': tally.comment_count,
+            'comment_length': tally.comment_length,
+            'comment_matches': tally.comment_matches,
+            'count_definitions': tally.count_definitions,
+            'count_defined': tally.count_defined,
+            'synonyms': dict(tally.synonyms),
+        },
+    }
+    sections = [
+        ('iris', encode_strings(graph.iris)),
+        ('labels', encode_strings(label or u'' for label in graph.labels)),
+        ('has_label', str(bytearray(label is not None for label in graph.labels))),
+        ('root_node', str(graph.root_node)),
+        ('tables', pickle.dumps(tables, pickle.HIGHEST_PROTOCOL)),
+    ]
+    sections.extend((name, getattr(graph, name).tostring()) for name in ARRAYS)
+    sections.extend((name, array('i', getattr(graph.depths, name)).tostring()) for name in DEPTHS)
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = snapshot_path(directory, owl.url, owl.already_converted, owl.wordnet)
+    spool = tally.spool
+    spool.flush()
+    comments_length = spool.tell()
+    index = {'byteorder': sys.byteorder, 'itemsize': array('i').itemsize, 'count': len(graph),
+             'content_hash': owl.content_hash}
+    offset = 0
+    for name, data in sections + [('comments', None)]:
+        length = comments_length if data is None else len(data)
+        index[name] = [offset, length]
+        offset += length + padding(length)
+    header = json.dumps(index)
+    header = MAGIC + struct.pack('<I', len(header)) + header
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for data in [header] + [data for name, data in sections]:
+                out.write(data + '\x00' * padding(len(data)))
+            spool.seek(0)
+            shutil.copyfileobj(spool, out)
+        os.rename(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    start = len(header) + padding(len(header))
+    tally.corpus = CommentCorpus(path, header, start + index['comments'][0], comments_length)
+    return path
+
+
+def load(directory, url, already_converted, wordnet=True):
+    # the Owl saved for url (parsed with or without WordNet), or None if
+    # there is no usable snapshot
+    path = snapshot_path(directory, url, already_converted, wordnet)
+    try:
+        snapshot_file = open(path, 'rb')
+    except IOError:
+        return None
+    with snapshot_file:
+        if snapshot_file.read(len(MAGIC)) != MAGIC:
+            return None
+        data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    with closing(data):
+        header_length, = struct.unpack('<I', data[len(MAGIC):len(MAGIC) + 4])
+        start = len(MAGIC) + 4
+        index = json.loads(data[start:start + header_length])
+        start += header_length
+        header = data[:start]
+        start += padding(start)
+        if index['byteorder'] != sys.byteorder or index['itemsize'] != array('i').itemsize:
+            return None
+
+        def section(name):
+            offset, length = index[name]
+            return data[start + offset:start + offset + length]
+
+        def int_array(name):
+            values = array('i')
+            values.fromstring(section(name))
+            return values
+
+        tables = pickle.loads(section('tables'))
+        count = index['count']
+        graph = Graph()
+        graph.iris = decode_strings(section('iris'), count)
+        graph.ids = dict(izip(graph.iris, xrange(count)))
+        graph.labels = [label if has else None for label, has in
+                        izip(decode_strings(section('labels'), count), bytearray(section('has_label')))]
+        graph.root_node = bytearray(section('root_node'))
+        for name in ARRAYS:
+            setattr(graph, name, int_array(name))
+        graph.depths = DepthResult(*[int_array(name).tolist() for name in DEPTHS])
+
+    owl = Owl.__new__(Owl)
+    owl.url = tables['url']
+    owl.already_converted = tables['already_converted']
+    owl.validators = tables['validators']
+    owl.content_hash = tables['content_hash']
+    owl.format = tables['format']
+    owl.bytes_read = tables['bytes_read']
+    owl.bytes_total = None
+    owl.elements = tables['elements']
+    owl.wordnet = tables.get('wordnet', True)
+    owl.imports = tables.get('imports', [])
+    owl.on_import = None
+    owl.read_seconds = 0.0
+    owl.domain_terms = ()
+    owl.progress = None
+    owl.changes = None
+    owl.graph = graph
+    for name in ('object_properties', 'data_properties', 'annotations'):
+        nodes = {}
+        for iri, label in tables[name]:
+            node = nodes[iri] = Node(iri)
+            node.label = label
+        setattr(owl, name, nodes)
+    tally = owl.tally = Tally(graph)
+    for name, value in tables['tally'].iteritems():
+        setattr(tally, name, value)
+    tally.synonyms = Counter(tally.synonyms)
+    offset, length = index['comments']
+    tally.corpus = CommentCorpus(path, header, start + offset, length)
+    return owl
+
+
+# where snapshots are kept; without it none are written or read
+directory = os.environ.get('OWLPARSER_SNAPSHOT_DIR') or None
@@ -0,0 +1,37 @@
+# -*- encoding: utf-8 -*-
+import codecs
+
+from ontparser.limits import LimitExceeded
+
+
+def iter_text(chunks, encoding='utf-8'):
+    # decode a stream of byte (or already unicode) chunks incrementally
+    decoder = codecs.getincrementaldecoder(encoding)('replace')
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            yield chunk
+        else:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+    text = decoder.decode('', final=True)
+    if text:
+        yield text
+
+
+def iter_lines(chunks, encoding='utf-8', max_length=0):
+    # yield complete lines, without line endings (\n or \r\n), from a
+    # chunked stream; a line longer than max_length (if set) raises
+    # LimitExceeded. Only \n ends a line: unicode.splitlines would also
+    # split on form feeds, \x1c-\x1e, \x85 and \u2028/\u2029 inside a
+    # line, and on a lone \r when \r\n straddles two chunks.
+    pending = u''
+    for text in iter_text(chunks, encoding):
+        lines = (pending + text).split(u'\n')
+        pending = lines.pop()
+        if max_length and len(pending) > max_length:
+            raise LimitExceeded('Line longer than {} characters'.format(max_length))
+        for line in lines:
+            yield line[:-1] if line.endswith(u'\r') else line
+    if pending:
+        yield pending[:-1] if pending.endswith(u'\r') else pending
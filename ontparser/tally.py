@@ -0,0 +1,95 @@
+# -*- encoding: utf-8 -*-
+import time
+from collections import Counter
+
+from ontparser import lexicon
+
+
+class Tally(object):
+    # Count-based inputs of the quality metrics, updated from parse events
+    # as they arrive so that no comment text is kept for scoring: comment
+    # count and length, how many comments contain each domain term, and the
+    # WordNet counts of the class labels. A class label may be replaced
+    # later in the document, so a label's WordNet contribution is taken
+    # back when it is. With a spool file, the lower-cased comments are also
+    # written there (NUL-separated) for a snapshot, whose comment corpus
+    # then answers terms that were not counted while parsing. Without
+    # wordnet, labels are only recorded, and their counts are filled in
+    # once the parse is done: by count_labels, or by releases.update from
+    # the previous release of the ontology.
+
+    def __init__(self, graph, domain_terms=(), spool=None, wordnet=True):
+        self.graph = graph
+        self.wordnet = wordnet
+        self.spool = spool
+        self.corpus = None
+        self.terms = frozenset(term.lower() for term in domain_terms)
+        self.comment_count = 0
+        self.comment_length = 0
+        self.comment_matches = dict.fromkeys(self.terms, 0)
+        self.count_definitions = 0  # WordNet synsets over all class labels
+        self.count_defined = 0      # classes whose label is in WordNet
+        self.synonyms = Counter()   # synset head word -> classes naming it
+        self.wordnet_seconds = 0.0
+
+    def comment(self, text):
+        text = text or u''
+        self.comment_count += 1
+        self.comment_length += len(text)
+        if self.terms or self.spool is not None:
+            text = text.lower()
+            matches = self.comment_matches
+            for term in self.terms:
+                if term in text:
+                    matches[term] += 1
+            if self.spool is not None:
+                self.spool.write(text.encode('utf-8') + '\x00')
+
+    def covers(self, terms):
+        corpus = self.corpus
+        return (corpus is not None and not corpus.stale) or terms <= self.terms
+
+    def comment_hits(self, terms):
+        # like TextIndex.count_all, over the comments seen while parsing
+        matches = self.comment_matches
+        total = 0
+        for term in terms:
+            term = term.lower()
+            if term not in matches:
+                matches[term] = self.corpus.count(term) if term else self.comment_count
+            total += matches[term]
+        return total
+
+    def label(self, node_id, label):
+        graph = self.graph
+        if not self.wordnet:
+            graph.labels[node_id] = label
+            return
+        started = time.time()
+        self.add_entry(lexicon.wordnet.lookup(graph.labels[node_id]), -1)
+        entry = lexicon.wordnet.lookup(label)
+        self.add_entry(entry, 1)
+        self.wordnet_seconds += time.time() - started
+        graph.labels[node_id] = label
+        graph.wn_count[node_id] = entry.count
+
+    def count_labels(self, lookup):
+        # the WordNet counts of every class label at once; lookup maps a
+        # label to its WordNetEntry
+        graph = self.graph
+        wn_count = graph.wn_count
+        for node_id, label in enumerate(graph.labels):
+            entry = lookup(label)
+            self.add_entry(entry, 1)
+            wn_count[node_id] = entry.count
+
+    def add_entry(self, entry, sign):
+        if not entry.count:
+            return
+        self.count_defined += sign
+        self.count_definitions += sign * entry.count
+        synonyms = self.synonyms
+        for name in entry.names:
+            synonyms[name] += sign
+            if not synonyms[name]:
+                del synonyms[name]
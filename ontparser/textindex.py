@@ -0,0 +1,49 @@
+# -*- encoding: utf-8 -*-
+from bisect import bisect_right
+
+SEPARATOR = u'\x00'
+
+
+class TextIndex(object):
+    # Lower-cased text of every entity and comment of an ontology, joined
+    # into one corpus string so that substring search runs in C
+    # (unicode.find) instead of one Python-level comparison per entity.
+    # starts[i] is the offset of document i within the corpus.
+
+    def __init__(self, texts):
+        self.starts = []
+        offset = 0
+        parts = []
+        for text in texts:
+            text = text or u''
+            self.starts.append(offset)
+            parts.append(text)
+            offset += len(text) + 1
+        self.starts.append(offset)
+        self.corpus = SEPARATOR.join(parts).lower()
+        self._counts = {}
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def count(self, term):
+        # number of documents containing term, ignoring case
+        term = term.lower()
+        if term in self._counts:
+            return self._counts[term]
+        if not term:
+            return len(self)
+        corpus = self.corpus
+        starts = self.starts
+        matches = 0
+        pos = corpus.find(term)
+        while pos != -1:
+            doc = bisect_right(starts, pos) - 1
+            matches += 1
+            # skip the rest of this document: each counts once
+            pos = corpus.find(term, starts[doc + 1])
+        self._counts[term] = matches
+        return matches
+
+    def count_all(self, terms):
+        return sum(self.count(term) for term in terms)
@@ -0,0 +1,244 @@
+# -*- encoding: utf-8 -*-
+import re
+from itertools import count
+from urlparse import urljoin
+
+from ontparser import limits
+from ontparser.limits import LimitExceeded
+from ontparser.rdf import RDF_FIRST, RDF_NIL, RDF_REST, RDF_TYPE, TripleHandler
+from ontparser.streams import iter_text
+
+PN_CHARS_BASE = u'A-Za-zÀ-ÖØ-öø-˿Ͱ-ͽͿ-῿‌-‍⁰-↏Ⰰ-⿯、-퟿豈-﷏ﷰ-�'
+PN_CHARS = u'\\-' + PN_CHARS_BASE + u'_0-9·̀-ͯ‿-⁀'
+PLX = u'%[0-9A-Fa-f]{2}|\\\\[-_~.!$&\'()*+,;=/?#@%]'
+PN_PREFIX = u'[%s](?:[%s.]*[%s])?' % (PN_CHARS_BASE, PN_CHARS, PN_CHARS)
+PN_LOCAL = u'(?:[%s_:0-9]|%s)(?:(?:[%s.:]|%s)*(?:[%s:]|%s))?' % (
+    PN_CHARS_BASE, PLX, PN_CHARS, PLX, PN_CHARS, PLX)
+
+TOKENS = re.compile(u'|'.join([
+    u'(?P<space>(?:\\s|#[^\\n\\r]*)+)',
+    u'(?P<iri><[^<>"{}|^`\\\\\\x00-\\x20]*>)',
+    u'(?P<long>"""(?:[^"\\\\]|\\\\.|"(?!""))*"""|\'\'\'(?:[^\'\\\\]|\\\\.|\'(?!\'\'))*\'\'\')',
+    u'(?P<string>"(?:[^"\\\\\\n\\r]|\\\\.)*"|\'(?:[^\'\\\\\\n\\r]|\\\\.)*\')',
+    u'(?P<langtag>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)',
+    u'(?P<datatype>\\^\\^)',
+    u'(?P<number>[+-]?(?:[0-9]+\\.[0-9]*[eE][+-]?[0-9]+|\\.?[0-9]+[eE][+-]?[0-9]+|[0-9]*\\.[0-9]+|[0-9]+))',
+    u'(?P<blank>_:[%s0-9](?:[%s.]*[%s])?)' % (PN_CHARS_BASE + u'_', PN_CHARS, PN_CHARS),
+    u'(?P<pname>(?:%s)?:(?:%s)?)' % (PN_PREFIX, PN_LOCAL),
+    u'(?P<word>[A-Za-z]+)',
+    u'(?P<punct>[\\[\\](),;.])',
+]), re.UNICODE)
+
+LOOKAHEAD = 16
+ABSOLUTE = re.compile(u'[A-Za-z][A-Za-z0-9+.-]*:')
+ESCAPES = re.compile(u'\\\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))', re.DOTALL)
+ESCAPED_CHARS = {u't': u'\t', u'b': u'\b', u'n': u'\n', u'r': u'\r', u'f': u'\f'}
+
+
+def unescape(text):
+    def replace(match):
+        code = match.group(1) or match.group(2)
+        if code:
+            return unichr(int(code, 16)) if int(code, 16) < 0x10000 else (u'\\U' + code).decode('unicode-escape')
+        return ESCAPED_CHARS.get(match.group(3), match.group(3))
+    return ESCAPES.sub(replace, text)
+
+
+def tokenize(chunks, max_length=0):
+    # Yield (kind, text) tokens. A token that ends close to the end of the
+    # buffered text may continue in the next chunk (1.5 -> 1.5e3,
+    # ex:a -> ex:a.b), so it is only emitted once more text has arrived or
+    # the input has ended. A token longer than max_length (if set) raises
+    # LimitExceeded.
+    buf = u''
+    pos = 0
+    chunks = iter_text(chunks)
+    eof = False
+    while True:
+        match = TOKENS.match(buf, pos)
+        if match is None or (not eof and (
+                len(buf) - match.end() < LOOKAHEAD or
+                # an empty string may be the start of an unterminated long one
+                (match.group() in (u'""', u"''") and buf.startswith(match.group()[0] * 3, pos)))):
+            if eof:
+                if pos < len(buf):
+                    raise RuntimeError('Turtle syntax error near %r' % buf[pos:pos + 40])
+                return
+            buf = buf[pos:]
+            pos = 0
+            if max_length and len(buf) > max_length + LOOKAHEAD:
+                raise LimitExceeded('Token longer than {} characters'.format(max_length))
+            try:
+                buf += next(chunks)
+            except StopIteration:
+                eof = True
+            continue
+        pos = match.end()
+        kind = match.lastgroup
+        if kind != 'space':
+            yield kind, match.group()
+
+
+class TurtleParser(object):
+    # Streaming recursive-descent Turtle parser feeding a TripleHandler
+
+    def __init__(self, handler, base=''):
+        self.handler = handler
+        self.base = base
+        self.prefixes = {}
+        self.blank_ids = count()
+
+    def parse(self, chunks):
+        self.tokens = tokenize(chunks, limits.MAX_TEXT_LENGTH)
+        self.token = None
+        self.advance()
+        while self.token is not None:
+            self.statement()
+
+    def advance(self):
+        self.token = next(self.tokens, None)
+
+    def expect(self, text):
+        if self.token is None or self.token[1] != text:
+            raise RuntimeError('Turtle syntax error: expected %r, found %r' % (text, self.token))
+        self.advance()
+
+    def blank(self):
+        return '_:g%d' % next(self.blank_ids)
+
+    def statement(self):
+        kind, text = self.token
+        keyword = text.lower()
+        if kind == 'langtag' and keyword in ('@prefix', '@base'):
+            self.advance()
+            self.directive(keyword[1:])
+            self.expect(u'.')
+        elif kind == 'word' and keyword in ('prefix', 'base'):
+            self.advance()
+            self.directive(keyword)
+        else:
+            self.triples()
+            self.expect(u'.')
+
+    def directive(self, keyword):
+        if keyword == 'prefix':
+            kind, prefix = self.token
+            if kind != 'pname' or not prefix.endswith(u':'):
+                raise RuntimeError('Turtle syntax error: bad prefix %r' % prefix)
+            self.advance()
+            self.prefixes[prefix[:-1]] = self.iri()
+        else:
+            self.base = self.iri()
+
+    def triples(self):
+        if self.token == ('punct', u'['):
+            subject = self.blank_node_property_list()
+            if self.token is not None and self.token[1] != u'.':
+                self.predicate_object_list(subject)
+        else:
+            subject = self.subject()
+            self.predicate_object_list(subject)
+
+    def subject(self):
+        kind, text = self.token
+        if kind == 'blank':
+            self.advance()
+            return text
+        if text == u'(':
+            return self.collection()
+        return self.iri()
+
+    def predicate_object_list(self, subject):
+        while True:
+            if self.token == ('word', u'a'):
+                self.advance()
+                predicate = RDF_TYPE
+            else:
+                predicate = self.iri()
+            self.object_list(subject, predicate)
+            if self.token != ('punct', u';'):
+                return
+            while self.token == ('punct', u';'):
+                self.advance()
+            if self.token is None or self.token[1] in (u'.', u']'):
+                return
+
+    def object_list(self, subject, predicate):
+        while True:
+            self.object(subject, predicate)
+            if self.token != ('punct', u','):
+                return
+            self.advance()
+
+    def object(self, subject, predicate):
+        if self.token is None:
+            raise RuntimeError('Turtle syntax error: unexpected end of input')
+        kind, text = self.token
+        triple = self.handler.triple
+        if kind in ('string', 'long'):
+            self.advance()
+            quote = 3 if kind == 'long' else 1
+            value = unescape(text[quote:-quote])
+            if self.token is not None and self.token[0] == 'langtag':
+                self.advance()
+            elif self.token == ('datatype', u'^^'):
+                self.advance()
+                self.iri()
+            triple(subject, predicate, value, literal=True)
+        elif kind == 'number':
+            self.advance()
+            triple(subject, predicate, text, literal=True)
+        elif kind == 'word' and text in (u'true', u'false'):
+            self.advance()
+            triple(subject, predicate, text, literal=True)
+        elif kind == 'blank':
+            self.advance()
+            triple(subject, predicate, text)
+        elif text == u'[':
+            triple(subject, predicate, self.blank_node_property_list())
+        elif text == u'(':
+            triple(subject, predicate, self.collection())
+        else:
+            triple(subject, predicate, self.iri())
+
+    def blank_node_property_list(self):
+        self.expect(u'[')
+        node = self.blank()
+        if self.token != ('punct', u']'):
+            self.predicate_object_list(node)
+        self.expect(u']')
+        return node
+
+    def collection(self):
+        self.expect(u'(')
+        cells = []
+        while self.token is not None and self.token != ('punct', u')'):
+            cell = self.blank()
+            self.object(cell, RDF_FIRST)
+            cells.append(cell)
+        self.expect(u')')
+        for cell, rest in zip(cells, cells[1:] + [RDF_NIL]):
+            self.handler.triple(cell, RDF_REST, rest)
+        return cells[0] if cells else RDF_NIL
+
+    def iri(self):
+        if self.token is None:
+            raise RuntimeError('Turtle syntax error: unexpected end of input')
+        kind, text = self.token
+        if kind == 'iri':
+            self.advance()
+            iri = unescape(text[1:-1])
+            if self.base and not ABSOLUTE.match(iri):
+                iri = urljoin(self.base, iri)
+            return iri
+        if kind == 'pname':
+            self.advance()
+            prefix, _, local = text.partition(u':')
+            if prefix not in self.prefixes:
+                raise RuntimeError('Turtle syntax error: undefined prefix %r' % prefix)
+            return self.prefixes[prefix] + re.sub(u'\\\\(.)', u'\\1', local)
+        raise RuntimeError('Turtle syntax error: expected an IRI, found %r' % (self.token,))
+
+
+def parse_turtle(owl, chunks):
+    TurtleParser(TripleHandler(owl), owl.url if owl.url.startswith('http') else '').parse(chunks)
@@ -0,0 +1,41 @@
+# -*- encoding: utf-8 -*-
+import json
+import os
+import sys
+import traceback
+
+from ontparser import warm_up
+from ontparser.limits import LimitExceeded
+from ontparser.quality import owl_quality
+from ontparser.restapi import EXECUTE_OPTIONS
+
+
+def main():
+    # Scoring process of the async server: reads one JSON request per line
+    # from stdin (url, semiotic_quality_flags, domain and the other
+    # /rest/execute options) and answers each with one line on stdout,
+    # {"result": ...} or {"error": ..., "status": ...}, the status
+    # /rest/execute answers the error with. Everything else printed goes
+    # to stderr.
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    warm_up()
+    for line in iter(sys.stdin.readline, ''):
+        request = json.loads(line)
+        try:
+            options = dict((name, request[name]) for name in EXECUTE_OPTIONS if name in request)
+            reply = {'result': owl_quality(request['url'], set(request['semiotic_quality_flags']),
+                                           request.get('domain'), **options)}
+        except LimitExceeded as e:
+            reply = {'error': str(e), 'status': 413}
+        except ValueError as e:
+            reply = {'error': str(e), 'status': 400}
+        except Exception as e:
+            traceback.print_exc()
+            reply = {'error': str(e), 'status': 500}
+        replies.write(json.dumps(reply) + '\n')
+        replies.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+import argparse
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='download ontologies into the local mirror ahead of evaluation')
+    arg_parser.add_argument('url_file',
+                            help='file listing one ontology url per line')
+    arg_parser.add_argument('--mirror',
+                            help='mirror directory (default: $OWLPARSER_MIRROR_DIR)')
+    arg_parser.add_argument('--workers',
+                            type=int,
+                            default=8,
+                            help='concurrent downloads')
+    arg_parser.add_argument('--force',
+                            action='store_true',
+                            help='download again even if a copy is present')
+    args = arg_parser.parse_args()
+    if args.mirror:
+        os.environ['OWLPARSER_MIRROR_DIR'] = args.mirror
+    if not os.environ.get('OWLPARSER_MIRROR_DIR'):
+        arg_parser.error('give --mirror DIR or set OWLPARSER_MIRROR_DIR')
+    from ontparser.mirror import create_mirror
+    mirror = create_mirror()
+
+    with open(args.url_file) as url_file:
+        urls = [line.strip() for line in url_file
+                if line.strip() and not line.startswith('#')]
+
+    def fetch(url):
+        started = time.time()
+        try:
+            path = mirror.fetch(url, force=args.force)
+        except Exception as e:
+            return 'FAILED %s: %s' % (url, e)
+        return 'ok %s -> %s (%d bytes, %.1fs)' % (url, path, os.path.getsize(path),
+                                                  time.time() - started)
+
+    pool = ThreadPool(args.workers)
+    failed = 0
+    for line in pool.imap_unordered(fetch, urls):
+        failed += line.startswith('FAILED')
+        print line
+    pool.close()
+    pool.join()
+    print '%d of %d fetched' % (len(urls) - failed, len(urls))
+
+
+if __name__ == '__main__':
+    main()
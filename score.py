@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+from StringIO import StringIO
+
+SEMIOTIC_QUALITY_FLAGS = ('syntactic', 'semantic', 'pragmatic', 'social')
+
+# CSV columns after file: the owl_quality result, flattened
+METRICS = [
+    ('overall_quality', None),
+    ('syntactic', ('quality', 'lawfulness', 'richness', 'structure', 'tangledness', 'fan_out')),
+    ('semantic', ('quality', 'consistency', 'interpretability', 'precision')),
+    ('pragmatic', ('quality', 'accuracy', 'adaptability', 'comprehensiveness', 'ease_of_use',
+                   'relevance', 'depth', 'breadth', 'descendants')),
+    ('social', ('quality', 'authority', 'history', 'recognition')),
+]
+
+# --sections -> OwlQuality report method
+SECTIONS = {
+    'tree': 'print_tree',
+    'labeled': 'print_labeled',
+    'unlabeled': 'print_unlabeled',
+}
+
+
+def expand(inputs):
+    # files, glob patterns (for shells that do not expand them), urls and
+    # '-' for stdin, in the order given
+    for name in inputs:
+        if name == '-' or name.startswith('http'):
+            yield name
+        elif glob.has_magic(name):
+            for path in sorted(glob.glob(name)):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield name
+
+
+def score(task):
+    # Score one file, in this process or a pool process. Errors and
+    # timeouts are reported in the returned outcome.
+    from ontparser.batch import Timeout, raise_timeout
+    from ontparser.quality import OwlQuality, load_owl, owl_quality
+
+    index, name, path, semiotic_quality_flags, domain, already_converted, wordnet, imports, \
+        mode, target_error, seed, sections, timeout = task
+    started = time.time()
+    outcome = {'index': index, 'file': name}
+    previous = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.alarm(timeout or 0)
+    try:
+        outcome['result'] = owl_quality(path, semiotic_quality_flags, domain,
+                                        already_converted=already_converted, wordnet=wordnet,
+                                        imports=imports, mode=mode, target_error=target_error,
+                                        seed=seed)
+        if sections:
+            # the parse is cached, and the depths and WordNet counts with it
+            # (a preview's parse has no WordNet counts)
+            quality = OwlQuality(load_owl(path, already_converted,
+                                          wordnet=wordnet and mode == 'full'),
+                                 semiotic_quality_flags, wordnet=wordnet)
+            outcome['sections'] = {}
+            for section in sections:
+                report = sys.stdout = StringIO()
+                try:
+                    getattr(quality, SECTIONS[section])()
+                finally:
+                    sys.stdout = sys.stderr
+                outcome['sections'][section] = report.getvalue()
+    except Timeout:
+        outcome['error'] = 'Timed out after {} seconds'.format(timeout)
+    except Exception as e:
+        traceback.print_exc()
+        outcome['error'] = str(e)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+    outcome['seconds'] = round(time.time() - started, 3)
+    return outcome
+
+
+def csv_row(outcome):
+    row = [outcome['file']]
+    result = outcome.get('result') or {}
+    for layer, metrics in METRICS:
+        if metrics is None:
+            row.append(result.get(layer))
+        else:
+            row.extend(result.get(layer, {}).get(metric) for metric in metrics)
+    row.append(outcome['seconds'])
+    row.append(outcome.get('error'))
+    return ['' if value is None else value for value in row]
+
+
+def csv_header():
+    header = ['file']
+    for layer, metrics in METRICS:
+        if metrics is None:
+            header.append(layer)
+        else:
+            header.extend('%s.%s' % (layer, metric) for metric in metrics)
+    return header + ['seconds', 'error']
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='score ontology files without the web server')
+    arg_parser.add_argument('inputs',
+                            nargs='+',
+                            metavar='FILE',
+                            help="ontology file, glob pattern, url, or '-' for stdin")
+    arg_parser.add_argument('--domain',
+                            help='domain to be considered')
+    arg_parser.add_argument('--exclude_semiotic_layer',
+                            action='append',
+                            choices=SEMIOTIC_QUALITY_FLAGS,
+                            help='semiotic layers to be excluded')
+    arg_parser.add_argument('--already_converted',
+                            action='store_true',
+                            help='the files are OWL/XML')
+    arg_parser.add_argument('--imports',
+                            action='store_true',
+                            help='score each file together with the ontologies it imports')
+    arg_parser.add_argument('--mode',
+                            choices=('full', 'preview'),
+                            default='full',
+                            help='preview: estimate the WordNet and domain metrics from samples')
+    arg_parser.add_argument('--target_error',
+                            type=float,
+                            help='confidence interval half-width a preview samples down to')
+    arg_parser.add_argument('--seed',
+                            type=int,
+                            help='seed of the samples a preview draws')
+    arg_parser.add_argument('--wordnet',
+                            action='store_true',
+                            help='look labels up in WordNet even with the semantic layer excluded')
+    arg_parser.add_argument('--format',
+                            choices=('json', 'ndjson', 'csv'),
+                            default='json',
+                            help='json: one list in input order; ndjson: one line per file as '
+                                 'it finishes; csv: one row per file in input order')
+    arg_parser.add_argument('--sections',
+                            action='append',
+                            choices=sorted(SECTIONS),
+                            default=[],
+                            help='add a text report to each outcome (json and ndjson only)')
+    arg_parser.add_argument('--workers',
+                            type=int,
+                            default=1,
+                            help='score this many files at a time, in separate processes')
+    arg_parser.add_argument('--timeout',
+                            type=int,
+                            help='per-file timeout in seconds')
+    args = arg_parser.parse_args()
+    if args.sections and args.format == 'csv':
+        arg_parser.error('--sections needs --format json or ndjson')
+    if args.target_error is not None and not args.target_error > 0:
+        arg_parser.error('--target_error must be positive')
+
+    flags = set(SEMIOTIC_QUALITY_FLAGS) - set(args.exclude_semiotic_layer or ())
+    # without the semantic layer or a domain, nothing needs WordNet (and
+    # nltk is not even imported)
+    wordnet = args.wordnet or 'semantic' in flags or bool(args.domain)
+
+    # the report goes to stdout; everything the scoring prints, to stderr
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    stdin_path = None
+    tasks = []
+    for index, name in enumerate(expand(args.inputs)):
+        path = name
+        if name == '-':
+            if stdin_path is None:
+                with tempfile.NamedTemporaryFile(prefix='owlparser-stdin-', delete=False) as copy:
+                    shutil.copyfileobj(sys.stdin, copy)
+                stdin_path = copy.name
+            path = stdin_path
+        tasks.append((index, name, path, flags, args.domain, args.already_converted, wordnet,
+                      args.imports, args.mode, args.target_error, args.seed, args.sections,
+                      args.timeout))
+
+    pool = None
+    if args.workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(args.workers, len(tasks)))
+        outcomes = pool.imap_unordered(score, tasks)
+    else:
+        outcomes = itertools.imap(score, tasks)
+
+    failed = 0
+    try:
+        if args.format == 'ndjson':
+            for outcome in outcomes:
+                failed += 'error' in outcome
+                out.write(json.dumps(outcome, sort_keys=True) + '\n')
+                out.flush()
+        else:
+            outcomes = sorted(outcomes, key=lambda outcome: outcome['index'])
+            failed = sum('error' in outcome for outcome in outcomes)
+            if args.format == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(csv_header())
+                for outcome in outcomes:
+                    writer.writerow(csv_row(outcome))
+            else:
+                json.dump(outcomes, out, sort_keys=True, indent=4, separators=(',', ': '))
+                out.write('\n')
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if stdin_path is not None:
+            os.remove(stdin_path)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()